@@ -1,25 +1,53 @@
 import os
 from dotenv import load_dotenv
-import json
+import asyncio
+import time
+from collections import OrderedDict
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 from app.mcp_tools import MCPToolManager
+from app.conversation_history import ConversationHistory, estimate_tokens
+from app.tool_index import ToolIndex
+from app import codec
 
 # Load environment variables from .env file
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class WebSocketAgent:
-    def __init__(self, model="gpt-4-turbo-preview"):
-        self.model = model
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            logger.error("OPENAI_API_KEY environment variable is not set")
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        self.client = AsyncOpenAI(api_key=self.api_key)
-        self.system_prompt = """You are an AI assistant integrated with an MCP (Multi-tool Command Protocol) system.
+# Session settings
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "1000"))  # Sessions kept before LRU eviction
+SESSION_TTL = float(os.getenv("AGENT_SESSION_TTL", "1800"))  # Seconds of inactivity before a session expires
+
+# Tool call settings
+TOOL_CALL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CALL_CONCURRENCY", "4"))  # Parallel tool calls per turn
+TOOL_CALL_TIMEOUT = float(os.getenv("AGENT_TOOL_CALL_TIMEOUT", "60"))  # Seconds before a tool call is abandoned
+
+# History settings
+HISTORY_MAX_TOKENS = int(os.getenv("AGENT_HISTORY_MAX_TOKENS", "8000"))  # Prompt budget per request
+HISTORY_SUMMARY = os.getenv("AGENT_HISTORY_SUMMARY", "false").lower() in ("1", "true", "yes")  # Summarize dropped turns
+
+# Tool selection settings
+TOOL_TOP_K = int(os.getenv("AGENT_TOOL_TOP_K", "16"))  # Tools sent per turn for large catalogs, 0 sends all
+TOOL_SELECTION_MIN_TOOLS = int(os.getenv("AGENT_TOOL_SELECTION_MIN_TOOLS", "32"))  # Catalogs up to this size are sent whole
+TOOLS_ALWAYS_INCLUDE = [
+    name.strip() for name in os.getenv("AGENT_TOOLS_ALWAYS_INCLUDE", "").split(",") if name.strip()
+]  # Tools sent on every turn regardless of relevance
+
+# Agent loop limits, per user message
+MAX_ROUNDS = int(os.getenv("AGENT_MAX_ROUNDS", "10"))  # Model calls per turn
+if MAX_ROUNDS < 1:
+    raise ValueError(f"AGENT_MAX_ROUNDS must be at least 1, got {MAX_ROUNDS}")
+MAX_TURN_SECONDS = float(os.getenv("AGENT_MAX_TURN_SECONDS", "120"))  # Wall time before no more rounds are started
+MAX_TURN_TOKENS = int(os.getenv("AGENT_MAX_TURN_TOKENS", "50000"))  # Prompt + completion tokens per turn
+
+# Receives streaming events (response_delta, tool_call_started, tool_call_finished)
+EventCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+BASE_SYSTEM_PROMPT = """You are an AI assistant integrated with an MCP (Multi-tool Command Protocol) system.
 Your primary role is to help users interact with various tools through the MCP protocol.
 When users request actions like creating folders or files, you should:
 1. Identify the appropriate MCP tool for the task
@@ -33,115 +61,396 @@ For example, if a user asks to create a folder, you should:
 
 Always try to understand the user's intent and use the available tools appropriately.
 Respond in a helpful and conversational manner."""
-        self.messages = [{"role": "system", "content": self.system_prompt}]
+
+class AgentSession:
+    """Conversation state of a single client"""
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.messages = ConversationHistory(HISTORY_MAX_TOKENS, summarize=HISTORY_SUMMARY)  # Without the system prompt
+        self.lock = asyncio.Lock()  # Serializes turns within the session
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+class WebSocketAgent:
+    def __init__(self, model="gpt-4-turbo-preview"):
+        self.model = model
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            logger.error("OPENAI_API_KEY environment variable is not set")
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        self.client = AsyncOpenAI(api_key=self.api_key)
+        self.system_prompt = BASE_SYSTEM_PROMPT
+        self._tools_version: Optional[Any] = None  # Catalog version the prompt and definitions were built for
+        self.tool_definitions: List[Dict[str, Any]] = []  # OpenAI tool payload for the current catalog
+        self.tool_index = ToolIndex()  # Relevance index over tool_definitions
         self.tool_manager = MCPToolManager()
+        self._default_session = AgentSession("default")
         
-    def set_available_tools(self, tools: List[Dict[str, Any]]):
-        """Update available tools and system prompt with tool descriptions"""
+    def set_available_tools(self, tools: List[Dict[str, Any]], version: Optional[Any] = None):
+        """
+        Update available tools and system prompt with tool descriptions
+
+        The prompt is rebuilt from BASE_SYSTEM_PROMPT only when the catalog
+        version changes, so repeated calls with the same catalog are no-ops.
+
+        Args:
+            tools: Tools in the catalog format (name, serverName, description, input_schema)
+            version: Catalog version, derived from the tools when omitted
+        """
+        if version is None:
+            version = hash(tuple((tool['serverName'], tool['name'], tool['description']) for tool in tools))
+        if version == self._tools_version:
+            return
+
         logger.info("Updating available tools")
         self.tool_manager.update_tools(tools)
+        # Tools exposed by several servers get a unique name per server
+        names = [self.tool_manager.function_name(tool['serverName'], tool['name']) for tool in tools]
         tools_description = "\n\nAvailable tools:\n"
-        for tool in tools:
-            tools_description += f"- {tool['name']}: {tool['description']} (from {tool['serverName']})\n"
-        self.system_prompt += tools_description
-        # Reset conversation history when tools are updated
-        self.messages = [{"role": "system", "content": self.system_prompt}]
+        for name, tool in zip(names, tools):
+            tools_description += f"- {name}: {tool['description']} (from {tool['serverName']})\n"
+        self.system_prompt = BASE_SYSTEM_PROMPT + tools_description
+        self.tool_definitions = [self._tool_definition(name, tool) for name, tool in zip(names, tools)]
+        self.tool_index = ToolIndex(self.tool_definitions, self.tool_index.counters)
+        self._tools_version = version
         logger.info("Tools updated successfully")
 
-    async def process_message(self, message: str) -> str:
-        """Process a user message and return a response"""
+    @staticmethod
+    def _tool_definition(name: str, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """OpenAI function definition of a catalog tool under name, using its real input schema"""
+        parameters = tool.get("input_schema") or {}
+        if parameters.get("type") != "object":
+            parameters = {"type": "object", "properties": {}}
+        return {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": tool["description"] or "",
+                "parameters": parameters
+            }
+        }
+
+    async def process_message(self, message: str, session: Optional[AgentSession] = None,
+                              on_event: Optional[EventCallback] = None) -> str:
+        """
+        Process a user message within a session and return a response
+
+        Args:
+            message: User message
+            session: Conversation to continue, the agent's default session if omitted
+            on_event: When given, the model response is streamed and token
+                deltas and tool call progress are reported through it
+        """
+        session = session or self._default_session
         logger.info("Processing message: %s", message)
-        self.messages.append({"role": "user", "content": message})
+        session.messages.append({"role": "user", "content": message})
 
         try:
-            response = await self._get_gpt_response()
-            result = await self._handle_response(response)
+            result = await self._run_turn(session, on_event)
             logger.info("Got response from GPT: %s", result)
             return result
         except Exception as e:
             logger.error("Error processing message: %s", str(e), exc_info=True)
             return f"Sorry, I encountered an error while processing your message: {str(e)}"
 
-    async def _get_gpt_response(self):
+    async def _run_turn(self, session: AgentSession, on_event: Optional[EventCallback] = None) -> str:
+        """
+        Bounded agent loop: call the model, run the tools it asks for and
+        feed their results back until it answers or a limit is reached
+        """
+        started = time.monotonic()
+        tokens_used = 0
+        for round_number in range(1, MAX_ROUNDS + 1):
+            response_message, tokens = await self._complete(session, on_event)
+            tokens_used += tokens
+            done, result = await self._handle_response(response_message, session, on_event)
+            if done:
+                return result
+
+            if time.monotonic() - started >= MAX_TURN_SECONDS:
+                limit = f"the {MAX_TURN_SECONDS:g}s time limit"
+                break
+            if tokens_used >= MAX_TURN_TOKENS:
+                limit = f"the {MAX_TURN_TOKENS} token limit"
+                break
+        else:
+            limit = f"the limit of {MAX_ROUNDS} rounds"
+
+        logger.warning("Agent turn stopped after %d rounds: reached %s", round_number, limit)
+        return f"I stopped working on this request after reaching {limit}. The tool results so far are in our conversation."
+
+    async def _complete(self, session: AgentSession, on_event: Optional[EventCallback] = None):
+        """One model call, returns the response message and the tokens it used"""
+        params = self._completion_params(session)
+        if on_event:
+            message = await self._stream_gpt_response(params, on_event)
+            # Streamed responses carry no usage, estimate it
+            tokens = sum(estimate_tokens(m) for m in params["messages"]) + estimate_tokens(message)
+        else:
+            response = await self._get_gpt_response(params)
+            message = response.choices[0].message
+            if response.usage:
+                tokens = response.usage.total_tokens
+            else:
+                tokens = sum(estimate_tokens(m) for m in params["messages"]) + estimate_tokens(message)
+        return message, tokens
+
+    def _completion_params(self, session: AgentSession) -> Dict[str, Any]:
+        """Parameters of a chat completion request for the session"""
+        # Tool definitions are built once per catalog version in set_available_tools,
+        # large catalogs are narrowed to the tools relevant to the user's message
+        definitions = self.tool_index.select(
+            self._last_user_message(session), TOOL_TOP_K, TOOLS_ALWAYS_INCLUDE, TOOL_SELECTION_MIN_TOOLS
+        )
+        params = {
+            "model": self.model,
+            "messages": session.messages.build(self.system_prompt)
+        }
+        if definitions:
+            params["tools"] = definitions
+            params["tool_choice"] = "auto"
+        return params
+
+    async def _get_gpt_response(self, params: Dict[str, Any]):
         """Get response from GPT model"""
         logger.info("Getting GPT response with model: %s", self.model)
-        functions = []
-        if self.tool_manager:
-            for tool in self.tool_manager.tools:
-                functions.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": tool["description"],
-                        "parameters": {
-                            "type": "object",
-                            "properties": tool.get("parameters", {}),
-                            "required": tool.get("required", [])
-                        }
-                    }
-                })
-
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=self.messages,
-                tools=functions if functions else None,
-                tool_choice="auto"
-            )
+            response = await self.client.chat.completions.create(**params)
             return response
         except Exception as e:
             logger.error("Error getting GPT response: %s", str(e), exc_info=True)
             raise
 
-    async def _handle_response(self, response):
-        """Handle the response from the model"""
+    async def _stream_gpt_response(self, params: Dict[str, Any], on_event: EventCallback) -> ChatCompletionMessage:
+        """Stream a response from GPT model, forwarding content deltas as they arrive"""
+        logger.info("Streaming GPT response with model: %s", self.model)
+        content = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}  # Index -> accumulated tool call
         try:
-            message = response.choices[0].message
+            stream = await self.client.chat.completions.create(stream=True, **params)
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    await on_event({"type": "response_delta", "content": delta.content})
+                for tool_call_delta in delta.tool_calls or []:
+                    tool_call = tool_calls.setdefault(
+                        tool_call_delta.index, {"id": "", "name": "", "arguments": ""}
+                    )
+                    if tool_call_delta.id:
+                        tool_call["id"] = tool_call_delta.id
+                    if tool_call_delta.function:
+                        tool_call["name"] += tool_call_delta.function.name or ""
+                        tool_call["arguments"] += tool_call_delta.function.arguments or ""
+        except Exception as e:
+            logger.error("Error streaming GPT response: %s", str(e), exc_info=True)
+            raise
+
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(content) or None,
+            tool_calls=[
+                ChatCompletionMessageToolCall(
+                    id=tool_call["id"],
+                    type="function",
+                    function=Function(name=tool_call["name"], arguments=tool_call["arguments"])
+                )
+                for _, tool_call in sorted(tool_calls.items())
+            ] or None
+        )
+
+    @staticmethod
+    def _last_user_message(session: AgentSession) -> str:
+        """Content of the latest user message, used to pick relevant tools"""
+        for message in reversed(session.messages):
+            if isinstance(message, dict) and message.get("role") == "user":
+                return message.get("content") or ""
+        return ""
 
+    async def _execute_tool_call(self, tool_call, semaphore: asyncio.Semaphore,
+                                 on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Execute one tool call, reporting its progress through on_event"""
+        async with semaphore:
+            if on_event:
+                await on_event({
+                    "type": "tool_call_started",
+                    "tool_call_id": tool_call.id,
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments
+                })
+            tool_response = await self._run_tool_call(tool_call)
+            if on_event:
+                await on_event({
+                    "type": "tool_call_finished",
+                    "tool_call_id": tool_call.id,
+                    "name": tool_call.function.name,
+                    "status": tool_response["status"]
+                })
+            return tool_response
+
+    async def _run_tool_call(self, tool_call) -> Dict[str, str]:
+        """Execute one tool call, turning failures and timeouts into error outputs"""
+        try:
+            tool_request = {
+                "toolUseId": tool_call.id,
+                "name": tool_call.function.name,
+                "input": codec.loads(tool_call.function.arguments)
+            }
+            logger.info("Executing tool: %s with input: %s", 
+                      tool_request["name"], tool_request["input"])
+            tool_result = await asyncio.wait_for(
+                self.tool_manager.execute_tool(tool_request),
+                timeout=TOOL_CALL_TIMEOUT
+            )
+            # The connection pool reports failures (unknown server, invalid
+            # input, MCP isError results) as error responses instead of raising
+            status = tool_result.get("status", "success") if isinstance(tool_result, dict) else "success"
+            return {
+                "tool_call_id": tool_call.id,
+                "status": status,
+                "output": codec.dumps_text(tool_result)
+            }
+        except asyncio.TimeoutError:
+            logger.error("Tool %s timed out after %ss", tool_call.function.name, TOOL_CALL_TIMEOUT)
+            return {
+                "tool_call_id": tool_call.id,
+                "status": "error",
+                "output": f"Error: tool call timed out after {TOOL_CALL_TIMEOUT} seconds"
+            }
+        except Exception as e:
+            logger.error("Error executing tool %s: %s", 
+                       tool_call.function.name, str(e), exc_info=True)
+            return {
+                "tool_call_id": tool_call.id,
+                "status": "error",
+                "output": f"Error: {str(e)}"
+            }
+
+    async def _handle_response(self, message: ChatCompletionMessage, session: AgentSession,
+                               on_event: Optional[EventCallback] = None) -> Tuple[bool, str]:
+        """
+        Handle the response message from the model
+
+        Returns:
+            (True, answer) for a final answer, which may be empty, or
+            (False, "") when tools were run and their results must be sent
+            back to the model
+        """
+        try:
             # Check if the model wants to use a tool
             if message.tool_calls:
                 logger.info("Model wants to use tools")
-                tool_responses = []
-                
-                for tool_call in message.tool_calls:
-                    try:
-                        tool_request = {
-                            "name": tool_call.function.name,
-                            "input": json.loads(tool_call.function.arguments)
-                        }
-                        logger.info("Executing tool: %s with input: %s", 
-                                  tool_request["name"], tool_request["input"])
-                        tool_result = await self.tool_manager.execute_tool(tool_request)
-                        tool_responses.append({
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps(tool_result)
-                        })
-                    except Exception as e:
-                        logger.error("Error executing tool %s: %s", 
-                                   tool_call.function.name, str(e), exc_info=True)
-                        tool_responses.append({
-                            "tool_call_id": tool_call.id,
-                            "output": f"Error: {str(e)}"
-                        })
+                # Run the turn's tool calls concurrently, gather keeps their order
+                semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+                tool_responses = await asyncio.gather(*(
+                    self._execute_tool_call(tool_call, semaphore, on_event)
+                    for tool_call in message.tool_calls
+                ))
 
                 # Add assistant's message with tool calls
-                self.messages.append(message)
+                session.messages.append(message)
                 
                 # Add tool response messages
                 for tool_response in tool_responses:
-                    self.messages.append({
+                    session.messages.append({
                         "role": "tool",
                         "tool_call_id": tool_response["tool_call_id"],
                         "content": tool_response["output"]
                     })
-
-                # Get final response after tool use
-                return await self.process_message("Please provide a response based on the tool results.")
+                return False, ""
             else:
                 # Regular response without tool use
                 logger.info("Regular response without tool use")
-                self.messages.append(message)
-                return message.content
+                session.messages.append(message)
+                return True, message.content or ""
         except Exception as e:
             logger.error("Error handling response: %s", str(e), exc_info=True)
             raise
+
+class AgentSessionManager:
+    """
+    Per-client agent sessions sharing one WebSocketAgent, and therefore one
+    AsyncOpenAI client and one tool catalog. Sessions are evicted in LRU
+    order beyond max_sessions and expire after idle_ttl seconds, sessions
+    running a turn are never evicted.
+    """
+
+    def __init__(self, agent: WebSocketAgent, max_sessions: int = MAX_SESSIONS,
+                 idle_ttl: float = SESSION_TTL):
+        self.agent = agent
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, AgentSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, client_id: str) -> AgentSession:
+        """Get or create the session of a client, marking it most recently used"""
+        self.evict_expired()
+        session = self._sessions.get(client_id)
+        if session is None:
+            session = AgentSession(client_id)
+            self._sessions[client_id] = session
+            self._evict_lru(keep=client_id)
+        else:
+            self._sessions.move_to_end(client_id)
+        session.touch()
+        return session
+
+    def _touch(self, session: AgentSession) -> None:
+        """Mark a session most recently used, keeping the LRU order in step with last_active"""
+        session.touch()
+        if self._sessions.get(session.client_id) is session:
+            self._sessions.move_to_end(session.client_id)
+
+    def _evict_lru(self, keep: str) -> None:
+        """Drop least recently used sessions beyond max_sessions, skipping keep and sessions mid-turn"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for client_id, session in list(self._sessions.items()):
+            if excess <= 0:
+                break
+            if client_id == keep or session.lock.locked():
+                continue
+            del self._sessions[client_id]
+            excess -= 1
+            logger.info("Evicted agent session %s (LRU)", client_id)
+
+    def remove(self, client_id: str) -> None:
+        """Drop a client's session"""
+        self._sessions.pop(client_id, None)
+
+    def evict_expired(self) -> int:
+        """Drop sessions idle for longer than idle_ttl, returns how many"""
+        deadline = time.monotonic() - self.idle_ttl
+        expired = []
+        # Least recently used sessions come first, sessions mid-turn are skipped
+        for client_id, session in self._sessions.items():
+            if session.lock.locked():
+                continue
+            if session.last_active > deadline:
+                break
+            expired.append(client_id)
+        for client_id in expired:
+            del self._sessions[client_id]
+        evicted = len(expired)
+        if evicted:
+            logger.info("Evicted %d idle agent sessions", evicted)
+        return evicted
+
+    async def process_message(self, client_id: str, message: str,
+                              on_event: Optional[EventCallback] = None) -> str:
+        """Run an agent turn in the client's session"""
+        session = self.get(client_id)
+        async with session.lock:
+            try:
+                return await self.agent.process_message(message, session, on_event)
+            finally:
+                self._touch(session)
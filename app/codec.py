@@ -0,0 +1,149 @@
+from typing import Any, Optional, Union
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Optional dependency
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency, msgspec.msgpack is used otherwise
+    msgpack = None
+
+def _default(obj: Any) -> Any:
+    """Fallback for objects the codecs can't serialize natively (e.g. pydantic models)"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+def _select_backend(preference: str) -> str:
+    """Pick the JSON backend: the preferred one if installed, else the fastest available"""
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    if preference != "auto":
+        if available.get(preference):
+            return preference
+        logger.warning(f"JSON codec {preference} is not available, falling back")
+    for name in ("orjson", "msgspec", "json"):
+        if available[name]:
+            return name
+    return "json"
+
+BACKEND = _select_backend(os.getenv("JSON_CODEC", "auto"))
+
+if BACKEND == "orjson":
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Decode JSON text or bytes, raises json.JSONDecodeError"""
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(data)
+
+elif BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return _encoder.encode(obj)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Decode JSON text or bytes, raises json.JSONDecodeError"""
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            doc = data if isinstance(data, str) else data.decode("utf-8", "replace")
+            raise json.JSONDecodeError(str(e), doc, 0) from e
+
+else:
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Decode JSON text or bytes, raises json.JSONDecodeError"""
+        return json.loads(data)
+
+def dumps_text(obj: Any) -> str:
+    """Encode an object to a JSON string"""
+    return dumps(obj).decode("utf-8")
+
+class EncodedFrame:
+    """A frame serialized ahead of time, sent as is by the outbound queues"""
+
+    __slots__ = ("type", "data", "_text", "_packed")
+
+    def __init__(self, frame_type: str, data: bytes):
+        self.type = frame_type
+        self.data = data
+        self._text: Optional[str] = None
+        self._packed: Optional[bytes] = None
+
+    @classmethod
+    def wrap(cls, frame_type: str, key: str, encoded: bytes) -> "EncodedFrame":
+        """Build {"type": frame_type, key: <encoded>} around an already encoded value"""
+        head = dumps({"type": frame_type})[:-1]
+        return cls(frame_type, head + b',' + dumps(key) + b':' + encoded + b'}')
+
+def frame_text(frame: Union[dict, EncodedFrame]) -> str:
+    """Text of a WebSocket frame, decoded once for pre-encoded frames"""
+    if isinstance(frame, EncodedFrame):
+        if frame._text is None:
+            frame._text = frame.data.decode("utf-8")
+        return frame._text
+    return dumps_text(frame)
+
+# MessagePack, used for binary frames on connections negotiating the subprotocol
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+if msgpack is not None:
+    def _pack(obj: Any) -> bytes:
+        return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+    def _unpack(data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    _UNPACK_ERRORS = (ValueError,)  # msgpack.UnpackValueError and friends
+
+elif msgspec is not None:
+    _msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=_default)
+    _msgpack_decoder = msgspec.msgpack.Decoder()
+    _pack = _msgpack_encoder.encode
+    _unpack = _msgpack_decoder.decode
+    _UNPACK_ERRORS = (msgspec.DecodeError,)
+
+else:
+    _pack = _unpack = None
+    _UNPACK_ERRORS = ()
+
+def msgpack_available() -> bool:
+    """Whether a MessagePack implementation is installed"""
+    return _pack is not None
+
+def pack(frame: Union[dict, EncodedFrame]) -> bytes:
+    """MessagePack encoding of a WebSocket frame, packed once for pre-encoded frames"""
+    if isinstance(frame, EncodedFrame):
+        if frame._packed is None:
+            frame._packed = _pack(loads(frame.data))
+        return frame._packed
+    return _pack(frame)
+
+def unpack(data: bytes) -> Any:
+    """Decode a MessagePack frame, raises json.JSONDecodeError like loads"""
+    try:
+        return _unpack(data)
+    except _UNPACK_ERRORS as e:
+        raise json.JSONDecodeError(f"Invalid MessagePack frame: {e}", "", 0) from e
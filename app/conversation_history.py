@@ -0,0 +1,175 @@
+from typing import Any, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate, good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_LINE_CHARS = 200
+TRUNCATION_MARKER = "\n[truncated {} characters]"
+
+def _field(message: Any, name: str) -> Any:
+    """Read a field from a message dict or an OpenAI message object"""
+    if isinstance(message, dict):
+        return message.get(name)
+    return getattr(message, name, None)
+
+def estimate_tokens(message: Any) -> int:
+    """Approximate number of tokens a chat message costs"""
+    chars = len(_field(message, "content") or "")
+    for tool_call in _field(message, "tool_calls") or []:
+        function = _field(tool_call, "function")
+        chars += len(_field(function, "name") or "") + len(_field(function, "arguments") or "")
+    return MESSAGE_OVERHEAD_TOKENS + chars // CHARS_PER_TOKEN
+
+def estimate_text_tokens(text: str) -> int:
+    """Approximate number of tokens of a plain string"""
+    return len(text) // CHARS_PER_TOKEN
+
+def _truncate_tool_results(messages: List[Any], excess_tokens: int) -> List[Any]:
+    """Copy of messages with the largest tool results shortened by about excess_tokens"""
+    messages = list(messages)
+    tool_indexes = [i for i, message in enumerate(messages)
+                    if isinstance(message, dict) and message.get("role") == "tool"]
+    tool_indexes.sort(key=lambda i: len(messages[i].get("content") or ""), reverse=True)
+
+    for i in tool_indexes:
+        if excess_tokens <= 0:
+            break
+        content = messages[i].get("content") or ""
+        marker_chars = len(TRUNCATION_MARKER.format(len(content)))  # Upper bound of the marker length
+        cut = min(len(content), excess_tokens * CHARS_PER_TOKEN + marker_chars)
+        if cut <= marker_chars:
+            continue
+        shortened = content[:len(content) - cut] + TRUNCATION_MARKER.format(cut)
+        messages[i] = {**messages[i], "content": shortened}
+        excess_tokens -= (len(content) - len(shortened)) // CHARS_PER_TOKEN
+    return messages
+
+class ConversationHistory:
+    """
+    Token-budgeted conversation of an agent session, without the system prompt.
+    Messages are grouped into turns, each starting at a user message and
+    holding the assistant and tool messages that answer it. Token counts are
+    computed once per message; the oldest turns are dropped (or folded into a
+    summary) when the conversation outgrows its budget. The current turn is
+    always kept, its tool results are truncated if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_tokens: int = 8000, summarize: bool = False,
+                 summary_max_tokens: int = 500):
+        """
+        Args:
+            max_tokens: Budget for the system prompt plus the conversation
+            summarize: Collapse dropped turns into a summary message
+            summary_max_tokens: Budget of the summary message
+        """
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self._messages: List[Any] = []
+        self._turns: List[List[int]] = []  # [message count, tokens] per turn, oldest first
+        self._tokens = 0
+        self._summary_lines: List[str] = []
+        self._summary_tokens = 0
+        self._system_prompt: Optional[Tuple[str, int]] = None  # Memoized (prompt, tokens)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __reversed__(self):
+        return reversed(self._messages)
+
+    @property
+    def total_tokens(self) -> int:
+        """Approximate tokens of the retained messages"""
+        return self._tokens
+
+    @property
+    def summary(self) -> Optional[str]:
+        """Summary of the dropped turns, if summarization is enabled"""
+        if not self._summary_lines:
+            return None
+        return "Summary of the earlier conversation:\n" + "\n".join(self._summary_lines)
+
+    def append(self, message: Any) -> None:
+        """Add a message and enforce the budget"""
+        tokens = estimate_tokens(message)
+        self._messages.append(message)
+        self._tokens += tokens
+
+        if _field(message, "role") == "user" or not self._turns:
+            self._turns.append([1, tokens])
+        else:
+            self._turns[-1][0] += 1
+            self._turns[-1][1] += tokens
+
+        self._trim(self.max_tokens - self._summary_tokens)
+
+    def extend(self, messages: List[Any]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def build(self, system_prompt: str) -> List[Any]:
+        """Messages to send: system prompt, optional summary and the most recent turns that fit the budget"""
+        if self._system_prompt is None or self._system_prompt[0] != system_prompt:
+            self._system_prompt = (system_prompt, MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(system_prompt))
+        budget = self.max_tokens - self._system_prompt[1] - self._summary_tokens
+
+        # Walk back from the newest turn, always keeping the current one
+        start = len(self._messages)
+        used = 0
+        for count, tokens in reversed(self._turns):
+            if used and used + tokens > budget:
+                break
+            used += tokens
+            start -= count
+
+        messages = [{"role": "system", "content": system_prompt}]
+        summary = self.summary
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        kept = self._messages[start:]
+        if used > budget:
+            # Only the current turn is left and it is over budget
+            kept = _truncate_tool_results(kept, used - budget)
+        messages.extend(kept)
+        return messages
+
+    def clear(self) -> None:
+        self._messages.clear()
+        self._turns.clear()
+        self._tokens = 0
+        self._summary_lines.clear()
+        self._summary_tokens = 0
+
+    def _trim(self, budget: int) -> None:
+        """Drop the oldest turns until the conversation fits the budget"""
+        while len(self._turns) > 1 and self._tokens > budget:
+            count, tokens = self._turns.pop(0)
+            dropped = self._messages[:count]
+            del self._messages[:count]
+            self._tokens -= tokens
+            if self.summarize:
+                self._add_to_summary(dropped)
+                budget = self.max_tokens - self._summary_tokens
+
+    def _add_to_summary(self, messages: List[Any]) -> None:
+        """Fold dropped user and assistant text into the cached summary"""
+        for message in messages:
+            role = _field(message, "role")
+            content = _field(message, "content")
+            if role not in ("user", "assistant") or not content:
+                continue
+            line = f"- {role}: {content[:SUMMARY_LINE_CHARS]}"
+            self._summary_lines.append(line)
+            self._summary_tokens += estimate_text_tokens(line) + 1
+
+        # Keep the most recent lines within the summary budget
+        while self._summary_lines and self._summary_tokens > self.summary_max_tokens:
+            line = self._summary_lines.pop(0)
+            self._summary_tokens -= estimate_text_tokens(line) + 1
@@ -0,0 +1,157 @@
+from typing import Dict, Any, Optional, List, Deque
+from collections import deque
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class ExecutionHistory:
+    """
+    Fixed-capacity ring buffer of tool executions.
+    Bounded by both an entry count and an approximate byte budget for the
+    recorded inputs, with secondary indexes by tool name and toolUseId.
+    Entries are addressed by a monotonically increasing sequence number,
+    slot = seq % capacity.
+    """
+
+    def __init__(self, capacity: int = 1000, max_bytes: int = 1_000_000):
+        """
+        Args:
+            capacity: Maximum number of entries kept
+            max_bytes: Approximate budget for the JSON size of recorded inputs
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._slots: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._sizes: List[int] = [0] * capacity
+        self._oldest = 0  # Sequence number of the oldest entry
+        self._next = 0  # Sequence number of the next entry
+        self._bytes = 0
+        self._by_tool: Dict[str, Deque[int]] = {}
+        self._by_use_id: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._next - self._oldest
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate size of the recorded inputs"""
+        return self._bytes
+
+    def record(self, tool_use_id: str, tool_name: str, tool_input: Any) -> Dict[str, Any]:
+        """
+        Append a pending execution, evicting the oldest entries if needed
+
+        Returns:
+            The entry, to be passed to complete() once the call finishes
+        """
+        size = self._estimate_size(tool_input)
+        if size > self.max_bytes:
+            # Keep the entry but not an input larger than the whole budget
+            tool_input = {'_truncated': True, 'size': size}
+            size = self._estimate_size(tool_input)
+
+        while len(self) >= self.capacity or (len(self) and self._bytes + size > self.max_bytes):
+            self._evict_oldest()
+
+        seq = self._next
+        entry = {
+            'seq': seq,
+            'toolUseId': tool_use_id,
+            'tool_name': tool_name,
+            'input': tool_input,
+            'timestamp': time.time(),
+            'monotonic': time.monotonic(),
+            'latency_ms': None,
+            'status': 'pending'
+        }
+        slot = seq % self.capacity
+        self._slots[slot] = entry
+        self._sizes[slot] = size
+        self._bytes += size
+        self._next += 1
+
+        self._by_tool.setdefault(tool_name, deque()).append(seq)
+        self._by_use_id[tool_use_id] = seq
+        return entry
+
+    def complete(self, entry: Dict[str, Any], status: str) -> None:
+        """Record the outcome and latency of an execution"""
+        entry['status'] = status
+        entry['latency_ms'] = (time.monotonic() - entry['monotonic']) * 1000
+
+    def get(self, tool_use_id: str) -> Optional[Dict[str, Any]]:
+        """Latest execution recorded for a toolUseId"""
+        seq = self._by_use_id.get(tool_use_id)
+        if seq is None:
+            return None
+        return self._slots[seq % self.capacity]
+
+    def query(self, limit: int = 100, tool_name: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Most recent executions, oldest first
+
+        Walks backwards from the newest entry (or the newest entry of
+        tool_name) and stops as soon as limit or the start of the time
+        window is reached.
+
+        Args:
+            limit: Maximum number of entries returned
+            tool_name: Only return executions of this tool
+            since: Only return entries with timestamp >= since (epoch seconds)
+            until: Only return entries with timestamp <= until (epoch seconds)
+        """
+        if tool_name is not None:
+            seqs = reversed(self._by_tool.get(tool_name, ()))
+        else:
+            seqs = range(self._next - 1, self._oldest - 1, -1)
+
+        results = []
+        for seq in seqs:
+            if len(results) >= limit:
+                break
+            entry = self._slots[seq % self.capacity]
+            if since is not None and entry['timestamp'] < since:
+                break
+            if until is not None and entry['timestamp'] > until:
+                continue
+            results.append(entry)
+        results.reverse()
+        return results
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        self._slots = [None] * self.capacity
+        self._sizes = [0] * self.capacity
+        self._oldest = self._next
+        self._bytes = 0
+        self._by_tool.clear()
+        self._by_use_id.clear()
+
+    def _evict_oldest(self) -> None:
+        seq = self._oldest
+        slot = seq % self.capacity
+        entry = self._slots[slot]
+        self._slots[slot] = None
+        self._bytes -= self._sizes[slot]
+        self._sizes[slot] = 0
+        self._oldest += 1
+
+        seqs = self._by_tool.get(entry['tool_name'])
+        if seqs and seqs[0] == seq:
+            seqs.popleft()
+            if not seqs:
+                del self._by_tool[entry['tool_name']]
+        if self._by_use_id.get(entry['toolUseId']) == seq:
+            del self._by_use_id[entry['toolUseId']]
+
+    @staticmethod
+    def _estimate_size(tool_input: Any) -> int:
+        try:
+            return len(json.dumps(tool_input, default=str))
+        except (TypeError, ValueError):
+            return len(str(tool_input))
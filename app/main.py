@@ -1,19 +1,28 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from typing import List, Dict, Any
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 import json
 import asyncio
 import logging
 import os
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 import subprocess
+import time
+from collections import OrderedDict
 from pathlib import Path
 from websocket_tool_manager import WebSocketToolManager, ToolResponse
+from jsonschema import ValidationError, SchemaError
 from contextlib import asynccontextmanager
 from asyncio import CancelledError
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.websockets import WebSocketState
 from sse_starlette.sse import EventSourceResponse
-from app.agent import WebSocketAgent
+from app.agent import WebSocketAgent, AgentSessionManager
+from app.tool_catalog import ToolCatalog
+from app.mcp_pool import MCPClientPool
+from app.tool_cache import SingleFlight, ToolResultCache, call_key
+from app.outbound_queue import OutboundQueue
+from app.codec import loads, frame_text, pack, unpack, msgpack_available, MSGPACK_SUBPROTOCOL
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -24,8 +33,35 @@ logger = logging.getLogger(__name__)
 ROOT_DIR = str(Path(__file__).parent.parent.parent.parent)
 CONFIG_PATH = str(Path(__file__).parent.parent / "config" / "mcp-servers.json")
 
-# Initialize the GPT agent
+# Startup settings
+STARTUP_CONCURRENCY = int(os.getenv("MCP_STARTUP_CONCURRENCY", "8"))  # Max servers handshaking at once
+REQUIRED_SERVERS = [
+    name.strip() for name in os.getenv("MCP_REQUIRED_SERVERS", "").split(",") if name.strip()
+]  # Servers that must be up before the app starts serving
+
+# Tool call settings
+MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "16"))  # Default concurrent requests per server session
+REPLICA_IDLE_TIMEOUT = float(os.getenv("MCP_REPLICA_IDLE_TIMEOUT", "300"))  # Seconds before extra replicas are reaped
+COALESCE_READ_ONLY = os.getenv("MCP_COALESCE_READ_ONLY", "true").lower() in ("1", "true", "yes")  # Share identical read-only calls
+CACHE_READ_ONLY_TTL = float(os.getenv("MCP_CACHE_READ_ONLY_TTL", "5"))  # Result TTL for read-only tools, 0 disables
+CACHE_MAX_ENTRIES = int(os.getenv("MCP_CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.getenv("MCP_CACHE_MAX_BYTES", "10000000"))
+
+# WebSocket settings
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # Frames queued per client before overflow
+SEND_OVERFLOW_POLICY = os.getenv("WS_SEND_OVERFLOW_POLICY", "coalesce")  # drop_oldest, coalesce or disconnect
+CLIENT_STATE_TTL = float(os.getenv("WS_CLIENT_STATE_TTL", "3600"))  # Seconds a disconnected client's state is retained
+MAX_CONCURRENT_MESSAGES = int(os.getenv("WS_MAX_CONCURRENT_MESSAGES", "8"))  # In-flight request_id messages per connection
+MAX_BATCH_SIZE = int(os.getenv("WS_MAX_BATCH_SIZE", "100"))  # Calls accepted in one call_tools_batch message
+BATCH_PARALLELISM = int(os.getenv("WS_BATCH_PARALLELISM", "8"))  # Default and maximum concurrent calls per batch
+ENABLE_MSGPACK = os.getenv("WS_ENABLE_MSGPACK", "true").lower() in ("1", "true", "yes")  # Offer the msgpack subprotocol
+
+# Agent settings
+STREAM_AGENT_RESPONSES = os.getenv("AGENT_STREAM", "false").lower() in ("1", "true", "yes")  # Default for agent_message "stream"
+
+# Initialize the GPT agent, shared by the per-client sessions
 agent = WebSocketAgent()
+agent_sessions = AgentSessionManager(agent)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -34,7 +70,7 @@ async def lifespan(app: FastAPI):
         # Startup
         logger.info("Starting WebSocket server...")
         await start_servers()  # Start servers first
-        await mcp_manager.initialize_mcp_servers()  # Then initialize MCP
+        await mcp_manager.initialize_mcp_servers()  # Then initialize MCP (returns once required servers are up)
         
         yield
         
@@ -61,8 +97,15 @@ app.add_middleware(
 )
 
 class MCPClient:
-    def __init__(self, server_params: StdioServerParameters):
+    def __init__(self, server_params: StdioServerParameters,
+                 on_tools_changed: Optional[Callable[[], Awaitable[None]]] = None,
+                 max_in_flight: int = MAX_IN_FLIGHT):
         self.server_params = server_params
+        self.on_tools_changed = on_tools_changed  # Called on tools/list_changed notifications
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0  # Requests sent to the server and awaiting a response
+        self.queued = 0  # Requests waiting for a free in-flight slot
         # Add /opt/homebrew/bin to PATH
         if 'env' not in self.server_params.__dict__:
             self.server_params.env = {}
@@ -71,7 +114,10 @@ class MCPClient:
         else:
             self.server_params.env['PATH'] = "/opt/homebrew/bin:/usr/local/bin:/usr/bin:/bin"
         self.session = None
-        self._client = None
+        self._runner: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._notification_tasks = set()
         
     async def __aenter__(self):
         """Async context manager entry"""
@@ -80,18 +126,80 @@ class MCPClient:
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.session:
-            await self.session.__aexit__(exc_type, exc_val, exc_tb)
-        if self._client:
-            await self._client.__aexit__(exc_type, exc_val, exc_tb)
+        await self.close()
 
     async def connect(self):
-        """Establishes connection to MCP server"""
-        self._client = stdio_client(self.server_params)
-        self.read, self.write = await self._client.__aenter__()
-        session = ClientSession(self.read, self.write)
-        self.session = await session.__aenter__()
-        await self.session.initialize()
+        """Establishes connection to MCP server
+
+        The stdio transport and the session are entered and exited by a
+        dedicated runner task, so a client can be connected from one task
+        (e.g. a concurrent startup task) and closed from another.
+        """
+        if not self._runner or self._runner.done():
+            self._ready = asyncio.Event()
+            self._closing = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+        runner = self._runner
+        ready = asyncio.create_task(self._ready.wait())
+        try:
+            await asyncio.wait({runner, ready}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # Cancelled mid-handshake (e.g. shutdown): nothing else owns the
+            # runner yet, stop it so the server process doesn't leak
+            await self._stop_runner()
+            raise
+        finally:
+            ready.cancel()
+
+        if not self._ready.is_set():
+            # The runner exited before the handshake finished, surface its error
+            runner.result()
+            raise RuntimeError("MCP server exited during initialization")
+
+    async def _run(self):
+        """Own the stdio transport and session until close() is requested"""
+        async with stdio_client(self.server_params) as (read, write):
+            async with ClientSession(read, write, message_handler=self._handle_message) as session:
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                try:
+                    await self._closing.wait()
+                finally:
+                    self.session = None
+
+    async def _handle_message(self, message: Any):
+        """Dispatch server notifications received by the session"""
+        if not isinstance(message, types.ServerNotification):
+            return
+        if isinstance(message.root, types.ToolListChangedNotification) and self.on_tools_changed:
+            # Refresh outside the session's receive loop, which must keep
+            # running to deliver the list_tools response
+            task = asyncio.create_task(self.on_tools_changed())
+            self._notification_tasks.add(task)
+            task.add_done_callback(self._notification_tasks.discard)
+
+    async def _stop_runner(self):
+        """Cancel a runner that hasn't finished its handshake and wait for it to exit"""
+        runner, self._runner = self._runner, None
+        if not runner:
+            return
+        self._closing.set()
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    async def close(self):
+        """Close the session and terminate the server process"""
+        if not self._runner:
+            return
+        self._closing.set()
+        try:
+            await self._runner
+        except CancelledError:
+            pass
+        finally:
+            self._runner = None
 
     async def get_available_tools(self) -> List[Any]:
         """List available tools"""
@@ -115,7 +223,21 @@ class MCPClient:
             tool_name = tool_name.split('.', 1)[1]
             
         logger.info(f"Tool call request received - Tool: {tool_name}, Params: {arguments}")
-        result = await self.session.call_tool(tool_name, arguments=arguments)
+
+        # The session tags every JSON-RPC request with its own id and routes
+        # responses back by id, so concurrent calls are pipelined on the
+        # same stdio stream and may complete out of order.
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            result = await self.session.call_tool(tool_name, arguments=arguments)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
         logger.info(f"Tool call result: {result}")
         
         # Convert result to tool response format
@@ -148,47 +270,144 @@ class MCPManager:
     def __init__(self):
         """Initialize the MCP manager"""
         self.mcp_clients = {}
-        self.client_tasks = {}  # Track tasks for each client
+        self.server_configs: Dict[str, Dict[str, Any]] = {}
+        self.startup_tasks: Dict[str, asyncio.Task] = {}  # Track startup task for each server
         self.tool_manager = WebSocketToolManager()
+        self.tool_catalog = ToolCatalog()
+        self.single_flight = SingleFlight()
+        self.on_catalog_changed: Optional[Callable[[], None]] = None  # Called when a refresh changes the catalog
+        self.result_cache = ToolResultCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+    def _load_configs(self) -> Dict[str, Dict[str, Any]]:
+        """Read mcp-servers.json and create a client for every new server"""
+        with open(CONFIG_PATH, "r") as f:
+            configs = json.load(f)
+
+        for server_name, config in configs.items():
+            if server_name in self.mcp_clients:
+                continue
+            self.mcp_clients[server_name] = self._create_pool(server_name, config)
+
+        self.server_configs = configs
+        return configs
+
+    def _create_pool(self, server_name: str, config: Dict[str, Any]) -> MCPClientPool:
+        """Create the replica pool for a server
 
-    async def initialize_mcp_servers(self):
-        """Initialize server configurations"""
+        ``replicas`` sets how many processes are started (default 1), ``min``
+        and ``max`` bound autoscaling (both default to ``replicas``) and
+        ``idle_timeout`` controls when replicas above ``min`` are reaped.
+        """
+        def create_client() -> MCPClient:
+            server_params = StdioServerParameters(
+                command=config["command"],
+                args=config.get("args", []),
+                env=dict(config.get("env", {}))
+            )
+            return MCPClient(
+                server_params,
+                on_tools_changed=lambda: self._on_tools_changed(server_name),
+                max_in_flight=config.get("max_in_flight", MAX_IN_FLIGHT)
+            )
+
+        replicas = config.get("replicas", 1)
+        return MCPClientPool(
+            server_name,
+            create_client,
+            min_replicas=config.get("min", replicas),
+            max_replicas=config.get("max", replicas),
+            initial_replicas=replicas,
+            idle_timeout=config.get("idle_timeout", REPLICA_IDLE_TIMEOUT)
+        )
+
+    def _required_servers(self, required_servers: Optional[List[str]] = None) -> List[str]:
+        """Resolve which servers must be up before startup completes
+
+        Precedence: explicit argument, MCP_REQUIRED_SERVERS, then servers
+        flagged ``"required": true`` in mcp-servers.json. When nothing is
+        configured every server is required.
+        """
+        if required_servers is None:
+            required_servers = REQUIRED_SERVERS or [
+                name for name, config in self.server_configs.items()
+                if config.get("required")
+            ]
+        if not required_servers:
+            return list(self.server_configs.keys())
+
+        unknown = [name for name in required_servers if name not in self.server_configs]
+        if unknown:
+            raise ValueError(f"Unknown required servers: {', '.join(unknown)}")
+        return list(required_servers)
+
+    async def initialize_mcp_servers(self, max_concurrency: Optional[int] = None,
+                                     required_servers: Optional[List[str]] = None):
+        """Start all configured servers concurrently
+
+        Every server is spawned in its own task (at most ``max_concurrency``
+        handshakes at a time) and registers its tools as soon as it is ready.
+        Returns once the required servers are connected; the others keep
+        starting in the background.
+        """
         try:
-            with open(CONFIG_PATH, "r") as f:
-                configs = json.load(f)
-                
-            for server_name, config in configs.items():
-                server_params = StdioServerParameters(
-                    command=config["command"],
-                    args=config.get("args", []),
-                    env=config.get("env", {})
-                )
-                self.mcp_clients[server_name] = MCPClient(server_params)
-                # Connecter immédiatement le serveur
-                await self.connect_to_server(server_name)
-                
+            configs = self._load_configs()
+            semaphore = asyncio.Semaphore(max_concurrency or STARTUP_CONCURRENCY)
+
+            async def start(server_name: str):
+                async with semaphore:
+                    await self.connect_to_server(server_name)
+
+            for server_name in configs:
+                task = self.startup_tasks.get(server_name)
+                if task and not task.done():
+                    continue
+                task = asyncio.create_task(start(server_name), name=f"mcp-startup-{server_name}")
+                task.add_done_callback(lambda t, name=server_name: self._on_startup_done(name, t))
+                self.startup_tasks[server_name] = task
+
+            required = self._required_servers(required_servers)
+            logger.info(f"Waiting for required MCP servers: {', '.join(required)}")
+            await asyncio.gather(*(self.startup_tasks[name] for name in required))
+            logger.info("Required MCP servers are ready")
+
         except Exception as e:
             logger.error(f"Failed to initialize MCP servers: {e}")
             raise
 
+    def _on_startup_done(self, server_name: str, task: asyncio.Task):
+        """Log the outcome of a background startup task"""
+        if task.cancelled():
+            return
+        if task.exception():
+            logger.error(f"Server {server_name} failed to start: {task.exception()}")
+        else:
+            logger.info(f"Server {server_name} is ready")
+
     async def load_server_configs(self):
         """Load server configurations"""
         try:
-            with open(CONFIG_PATH, "r") as f:
-                configs = json.load(f)
-                
-            for server_name, config in configs.items():
-                server_params = StdioServerParameters(
-                    command=config["command"],
-                    args=config.get("args", []),
-                    env=config.get("env", {})
-                )
-                self.mcp_clients[server_name] = MCPClient(server_params)
-                
+            self._load_configs()
         except Exception as e:
             logger.error(f"Failed to load server configurations: {e}")
             raise
 
+    def _register_tools(self, server_name: str, client: MCPClientPool, tools: List[Any]):
+        """Register a server's tools with the tool manager and the catalog"""
+        self.tool_catalog.set_server_tools(server_name, tools)
+        for tool in tools:
+            # Créer une fonction de rappel spécifique pour cet outil
+            async def tool_callback(arguments: Dict[str, Any], tool_name: str = tool.name) -> Dict[str, Any]:
+                return await client.call_tool(tool_name, arguments)
+
+            # Enregistrer l'outil avec le bon format
+            self.tool_manager.register_tool(
+                name=f"{server_name}.{tool.name}",
+                func=tool_callback,
+                description=tool.description,
+                input_schema=tool.inputSchema
+            )
+            logger.info(f"Registered tool: {server_name}.{tool.name}")
+
     async def connect_to_server(self, server_name: str):
         """Connect to an MCP server and register its tools"""
         if server_name not in self.mcp_clients:
@@ -197,37 +416,56 @@ class MCPManager:
         client = self.mcp_clients[server_name]
         
         try:
-            # Create and await the connection task
-            task = asyncio.create_task(client.__aenter__())
-            self.client_tasks[server_name] = task
-            await task
+            if client.session and self.tool_catalog.has_server(server_name):
+                # Already connected, the catalog is kept up to date by notifications
+                return self.tool_catalog.get_tools(server_name)
+
+            if not client.session:
+                await client.connect()
             
             # Get and register tools
             tools = await client.get_available_tools()
-            
-            # Register tools with the tool manager
-            for tool in tools:
-                # Créer une fonction de rappel spécifique pour cet outil
-                async def tool_callback(arguments: Dict[str, Any]) -> Dict[str, Any]:
-                    return await client.call_tool(tool.name, arguments)
-                
-                # Enregistrer l'outil avec le bon format
-                self.tool_manager.register_tool(
-                    name=f"{server_name}.{tool.name}",
-                    func=tool_callback,
-                    description=tool.description,
-                    input_schema=tool.inputSchema
-                )
-                logger.info(f"Registered tool: {server_name}.{tool.name}")
+            self._register_tools(server_name, client, tools)
                 
             return tools
             
         except Exception as e:
             logger.error(f"Failed to connect to server {server_name}: {e}")
-            if server_name in self.client_tasks:
-                del self.client_tasks[server_name]
             raise
 
+    async def refresh_tools(self, server_name: str) -> bool:
+        """Re-read a connected server's tool list and update the catalog"""
+        client = self.mcp_clients.get(server_name)
+        if not client or not client.session:
+            return False
+        version = self.tool_catalog.version
+        tools = await client.get_available_tools()
+        self._register_tools(server_name, client, tools)
+        if self.tool_catalog.version != version and self.on_catalog_changed:
+            self.on_catalog_changed()
+        return True
+
+    async def invalidate_tools(self, server_name: Optional[str] = None) -> int:
+        """Explicitly refresh the catalog for one server or all connected servers
+
+        Returns:
+            The catalog version after the refresh
+        """
+        server_names = [server_name] if server_name else list(self.mcp_clients.keys())
+        for name in server_names:
+            if name not in self.mcp_clients:
+                raise ValueError(f"Unknown server: {name}")
+            await self.refresh_tools(name)
+        return self.tool_catalog.version
+
+    async def _on_tools_changed(self, server_name: str):
+        """Handle a tools/list_changed notification from a server"""
+        logger.info(f"Tool list changed on server {server_name}")
+        try:
+            await self.refresh_tools(server_name)
+        except Exception as e:
+            logger.error(f"Failed to refresh tools for {server_name}: {e}")
+
     async def ensure_connection(self, server_name: str) -> bool:
         """Ensure connection to server exists, attempting reconnection if needed"""
         try:
@@ -240,23 +478,12 @@ class MCPManager:
             # Vérifier si le client est déjà connecté
             if not client.session:
                 logger.info(f"Connecting to server {server_name}...")
-                await client.__aenter__()
+                await client.connect()
             
             # Obtenir et réenregistrer les outils
             try:
                 tools = await client.get_available_tools()
-                
-                # Re-register tools with the tool manager
-                for tool in tools:
-                    async def tool_callback(arguments: Dict[str, Any]) -> Dict[str, Any]:
-                        return await client.call_tool(tool.name, arguments)
-                        
-                    self.tool_manager.register_tool(
-                        name=f"{server_name}.{tool.name}",
-                        func=tool_callback,
-                        description=tool.description,
-                        input_schema=tool.inputSchema
-                    )
+                self._register_tools(server_name, client, tools)
                 logger.info(f"Successfully connected to server {server_name}")
                 return True
             except Exception as tool_error:
@@ -268,41 +495,89 @@ class MCPManager:
             return False
 
     async def get_tools(self, server_name: str = None) -> List[Dict[str, Any]]:
-        """Get available tools, optionally filtered by server"""
-        tools = self.tool_manager.list_tools()
-        
-        # Convertir les outils au format attendu par le frontend
-        formatted_tools = []
-        for tool in tools:
-            # Extraire le nom du serveur du nom complet de l'outil
-            full_name = tool['name']
-            server, tool_name = full_name.split('.', 1)
-            
-            formatted_tools.append({
-                'name': tool_name,
-                'serverName': server,
-                'description': tool['description'],
-                'input_schema': tool['input_schema']
-            })
-        
-        # Filtrer par serveur si demandé
-        if server_name:
-            formatted_tools = [t for t in formatted_tools if t['serverName'] == server_name]
-            
-        return formatted_tools
+        """Get available tools from the catalog, optionally filtered by server"""
+        return self.tool_catalog.get_tools(server_name)
+
+    def _should_coalesce(self, server_name: str, tool_name: str) -> bool:
+        """Tools listed in the server's "coalesce" setting, or annotated read-only"""
+        config = self.server_configs.get(server_name, {})
+        if tool_name in config.get("coalesce", ()):
+            return True
+        return config.get("coalesce_read_only", COALESCE_READ_ONLY) and \
+            self.tool_catalog.is_read_only(server_name, tool_name)
+
+    def _cache_ttl(self, server_name: str, tool_name: str) -> float:
+        """Result TTL of a tool: the server's "cache" setting, or the read-only default"""
+        config = self.server_configs.get(server_name, {})
+        ttl = config.get("cache", {}).get(tool_name)
+        if ttl is not None:
+            return ttl
+        if self.tool_catalog.is_read_only(server_name, tool_name):
+            return config.get("cache_read_only_ttl", CACHE_READ_ONLY_TTL)
+        return 0
+
+    async def call_tool(self, server_name: str, tool_name: str, arguments: Dict,
+                        tool_use_id: Optional[str] = None) -> Dict:
+        """Call a tool with given arguments, recording the call in the execution history"""
+        qualified_name = tool_name if tool_name.startswith(f"{server_name}.") else f"{server_name}.{tool_name}"
+        entry = self.tool_manager.start_execution(tool_use_id or 'unknown', qualified_name, arguments)
+        status = 'cancelled'
+        try:
+            result = await self._call_tool(server_name, tool_name, arguments)
+            status = result.get("status", "success")
+            return result
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            self.tool_manager.finish_execution(entry, status)
 
-    async def call_tool(self, server_name: str, tool_name: str, arguments: Dict) -> Dict:
-        """Call a tool with given arguments"""
+    async def _call_tool(self, server_name: str, tool_name: str, arguments: Dict) -> Dict:
+        """Validate and run a tool call, serving read-only tools from the cache"""
         if server_name not in self.mcp_clients:
             raise ValueError(f"Not connected to server: {server_name}")
             
         # Add server prefix to tool name if not present
         if not tool_name.startswith(f"{server_name}."):
             tool_name = f"{server_name}.{tool_name}"
+        bare_name = tool_name.split('.', 1)[1]
             
         try:
+            if self.tool_manager.has_tool(tool_name):
+                # Reject invalid arguments with the validator compiled at registration
+                try:
+                    self.tool_manager.validate_input(tool_name, arguments)
+                except (ValidationError, SchemaError) as e:
+                    raise ValueError(f"Invalid input: {e.message}") from e
+
             client = self.mcp_clients[server_name]
-            result = await client.call_tool(tool_name, arguments)
+            key = call_key(server_name, bare_name, arguments)
+            ttl = self._cache_ttl(server_name, bare_name)
+            is_write = not ttl and not self.tool_catalog.is_read_only(server_name, bare_name)
+            if ttl:
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+            elif is_write:
+                # A write may change what the server's cached reads return
+                self.result_cache.invalidate_server(server_name)
+
+            async def fetch():
+                # A write bumping the server's generation meanwhile makes the result stale
+                generation = self.result_cache.generation(server_name)
+                return generation, await client.call_tool(tool_name, arguments)
+
+            if self._should_coalesce(server_name, bare_name):
+                # Identical concurrent calls share one upstream request
+                generation, result = await self.single_flight.do(key, fetch)
+            else:
+                generation, result = await fetch()
+
+            if ttl and result.get("status") == "success":
+                self.result_cache.put(key, result, ttl, generation)
+            elif is_write:
+                # Drop reads that were cached while the write was in flight
+                self.result_cache.invalidate_server(server_name)
             return result  # Return the response directly without modifying the type
         
         except Exception as e:
@@ -316,19 +591,65 @@ class MCPManager:
                 }
             }
 
+    async def call_tools_batch(self, calls: List[Dict[str, Any]], parallelism: int = BATCH_PARALLELISM,
+                               on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Run several tool calls concurrently
+
+        Args:
+            calls: Entries with "server", "tool" and optional "arguments"
+            parallelism: Maximum number of calls running at once
+            on_result: Called with each item result as soon as it completes
+
+        Returns:
+            Item results in the order of calls
+        """
+        semaphore = asyncio.Semaphore(max(1, parallelism))
+
+        async def run(index: int, call: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    response = await self.call_tool(call["server"], call["tool"], call.get("arguments", {}))
+                    item = {
+                        "index": index,
+                        "server": call["server"],
+                        "tool": call["tool"],
+                        "status": response.get("status", "success"),
+                        "result": response.get("result")
+                    }
+                except Exception as e:
+                    item = {
+                        "index": index,
+                        "server": call.get("server"),
+                        "tool": call.get("tool"),
+                        "status": "error",
+                        "result": {"status": "error", "error": str(e)}
+                    }
+            if on_result:
+                on_result(item)
+            return item
+
+        return await asyncio.gather(*(run(index, call) for index, call in enumerate(calls)))
+
     async def close_all_connections(self):
         """Clean up all MCP client connections"""
         errors = []
-        current_task = asyncio.current_task()
+
+        # Stop servers that are still starting in the background
+        for task in self.startup_tasks.values():
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self.startup_tasks.values(), return_exceptions=True)
+        self.startup_tasks.clear()
         
         for server_name, client in self.mcp_clients.items():
             try:
-                # Only close connections that were created in the current task
-                if server_name in self.client_tasks and self.client_tasks[server_name] == current_task:
-                    await client.__aexit__(None, None, None)
-                    del self.client_tasks[server_name]
+                await client.close()
             except Exception as e:
                 errors.append(f"Error closing {server_name}: {e}")
+            finally:
+                # The server's tools can no longer be called
+                self.tool_catalog.remove_server(server_name)
                 
         if errors:
             raise Exception("; ".join(errors))
@@ -339,26 +660,104 @@ class MCPManager:
         return message
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, queue_size: int = SEND_QUEUE_SIZE, overflow_policy: str = SEND_OVERFLOW_POLICY,
+                 state_ttl: float = CLIENT_STATE_TTL):
         self.active_connections: Dict[str, WebSocket] = {}  # client_id -> WebSocket
         self.client_servers: Dict[str, set] = {}  # client_id -> set of server names
+        self.outboxes: Dict[str, OutboundQueue] = {}  # client_id -> outbound queue of its latest connection
+        self._sockets: Dict[int, Tuple[str, OutboundQueue]] = {}  # id(WebSocket) -> (client_id, outbound queue)
+        self._disconnected: "OrderedDict[str, float]" = OrderedDict()  # client_id -> disconnect time, oldest first
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.state_ttl = state_ttl
 
-    async def connect(self, websocket: WebSocket, client_id: str):
-        """Connect a new WebSocket client"""
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, client_id: str, subprotocol: Optional[str] = None) -> OutboundQueue:
+        """
+        Connect a new WebSocket client, sending binary MessagePack frames if subprotocol is msgpack
+
+        A previous connection of the same client keeps its own queue until it
+        disconnects, so replies to its requests still reach it.
+
+        Returns:
+            The connection's outbound queue, replies to its messages go there
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        self.evict_stale()
         self.active_connections[client_id] = websocket
+        self._disconnected.pop(client_id, None)
+        binary = subprotocol == MSGPACK_SUBPROTOCOL
+        outbox = OutboundQueue(
+            client_id,
+            send=websocket.send_bytes if binary else websocket.send_text,
+            close=lambda: websocket.close(code=1008),  # Policy violation: fell behind
+            abort=lambda: websocket.close(code=1011),  # Internal error: sending failed
+            max_size=self.queue_size,
+            overflow_policy=self.overflow_policy,
+            encode=pack if binary else frame_text
+        )
+        outbox.start()
+        self.outboxes[client_id] = outbox
+        self._sockets[id(websocket)] = (client_id, outbox)
         if client_id not in self.client_servers:
             self.client_servers[client_id] = set()
         logger.info(f"Client {client_id} connected")
+        return outbox
 
     async def disconnect(self, websocket: WebSocket):
-        """Disconnect a client but maintain their server connections"""
-        # Find and remove client from active connections
-        for client_id, ws in self.active_connections.items():
-            if ws == websocket:
-                del self.active_connections[client_id]
-                logger.info(f"Client {client_id} disconnected")
+        """Disconnect a client but maintain their server connections for state_ttl seconds"""
+        entry = self._sockets.pop(id(websocket), None)
+        if entry is None:
+            return
+        client_id, outbox = entry
+        await outbox.close()
+        # The client's state stays with a newer connection of the same client
+        if self.active_connections.get(client_id) is not websocket:
+            return
+        del self.active_connections[client_id]
+        del self.outboxes[client_id]
+        self._disconnected[client_id] = time.monotonic()
+        logger.info(f"Client {client_id} disconnected")
+        self.evict_stale()
+
+    def evict_stale(self) -> int:
+        """Forget the state of clients disconnected for longer than state_ttl, returns how many"""
+        deadline = time.monotonic() - self.state_ttl
+        evicted = 0
+        while self._disconnected:
+            client_id, disconnected_at = next(iter(self._disconnected.items()))
+            if disconnected_at > deadline:
                 break
+            del self._disconnected[client_id]
+            self.client_servers.pop(client_id, None)
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted state of {evicted} disconnected clients")
+        return evicted
+
+    def session_counts(self) -> Dict[str, int]:
+        """Live connections and disconnected clients whose state is retained"""
+        return {
+            'live': len(self.active_connections),
+            'retained': len(self._disconnected)
+        }
+
+    def send(self, client_id: str, message: Any) -> bool:
+        """Queue a frame (dict or EncodedFrame) for a client's latest connection without waiting for the socket"""
+        outbox = self.outboxes.get(client_id)
+        if not outbox:
+            return False
+        return outbox.put(message)
+
+    def broadcast(self, message: Any) -> int:
+        """Queue a server push for every live connection, returns how many queued it"""
+        return sum(outbox.put(message) for _, outbox in list(self._sockets.values()))
+
+    def queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """Queue depth and counters per connected client"""
+        return {
+            client_id: {'depth': len(outbox), **outbox.stats}
+            for client_id, outbox in self.outboxes.items()
+        }
 
     def add_server_connection(self, client_id: str, server_name: str):
         """Track that a client is connected to a server"""
@@ -373,6 +772,17 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 mcp_manager = MCPManager()
+# The agent executes tools on the same server processes as the WebSocket clients
+agent.tool_manager.set_connection_pool(mcp_manager)
+
+def push_tools():
+    """Send the updated catalog to every client, queued pushes it supersedes are coalesced"""
+    catalog = mcp_manager.tool_catalog
+    agent.set_available_tools(catalog.get_tools(), catalog.version)
+    sent = manager.broadcast(catalog.tools_frame())
+    logger.info(f"Pushed tool catalog version {catalog.version} to {sent} connections")
+
+mcp_manager.on_catalog_changed = push_tools
 
 @app.post("/servers/start")
 async def start_servers():
@@ -385,20 +795,32 @@ async def start_servers():
         return {"status": "error", "message": str(e)}
 
 @app.get("/tools")
-async def get_tools():
-    """Get all available tools"""
+async def get_tools(request: Request):
+    """Get all available tools from the cached catalog"""
     try:
-        # First, make sure we're connected to all servers
-        for server_name in mcp_manager.mcp_clients.keys():
-            await mcp_manager.connect_to_server(server_name)
-        
-        # Then get all tools
-        tools = await mcp_manager.get_tools()
-        return tools
+        catalog = mcp_manager.tool_catalog
+        etag = catalog.etag
+        if catalog.matches_etag(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(
+            content=catalog.encoded(),
+            media_type="application/json",
+            headers={"ETag": etag}
+        )
     except Exception as e:
         logger.error(f"Error getting tools: {e}")
         return {"status": "error", "message": str(e)}
 
+@app.post("/tools/refresh")
+async def refresh_tools(server: Optional[str] = None):
+    """Invalidate the tool catalog for one server or all of them"""
+    try:
+        version = await mcp_manager.invalidate_tools(server)
+        return {"status": "success", "version": version}
+    except Exception as e:
+        logger.error(f"Error refreshing tools: {e}")
+        return {"status": "error", "message": str(e)}
+
 @app.get("/events")
 async def events(request: Request):
     """SSE endpoint for real-time updates"""
@@ -417,14 +839,205 @@ async def events(request: Request):
             
     return EventSourceResponse(event_generator())
 
+async def handle_message(client_id: str, message: Dict[str, Any], reply: Callable[[Dict[str, Any]], bool]):
+    """Handle one client message, sending every answer through reply"""
+    try:
+        if message["type"] == "connect":
+            server_name = message["server"]
+            logger.info(f"Client {client_id} requesting connection to server {server_name}")
+            
+            try:
+                await mcp_manager.connect_to_server(server_name)
+                manager.add_server_connection(client_id, server_name)
+                
+                reply({
+                    "type": "connection_established",
+                    "server": server_name
+                })
+                
+                # Update tools after new connection
+                tools = await mcp_manager.get_tools()
+                agent.set_available_tools(tools, mcp_manager.tool_catalog.version)  # Update agent's tools
+                reply({
+                    "type": "tools",
+                    "tools": tools
+                })
+                
+            except Exception as e:
+                logger.error(f"Error connecting to server {server_name}: {e}")
+                reply({
+                    "type": "error",
+                    "message": f"Error connecting to server: {str(e)}"
+                })
+
+        elif message["type"] == "get_tools":
+            # Served from the catalog, optionally filtered by server
+            server_name = message.get("server")
+            if server_name and server_name not in mcp_manager.mcp_clients:
+                reply({
+                    "type": "tools_response",
+                    "status": "error",
+                    "message": f"Unknown server: {server_name}"
+                })
+                return
+            reply({
+                "type": "tools_response",
+                "status": "success",
+                "tools": await mcp_manager.get_tools(server_name)
+            })
+
+        elif message["type"] == "call_tool":
+            # Direct tool invocation, without going through the agent
+            server_name = message.get("server")
+            tool_name = message.get("tool")
+            if not server_name or not tool_name:
+                reply({
+                    "type": "error",
+                    "message": "server and tool names are required"
+                })
+                return
+
+            try:
+                result = await mcp_manager.call_tool(
+                    server_name, tool_name, message.get("arguments", {}), message.get("request_id")
+                )
+                # Copy, the result may be shared with other callers through the cache
+                reply(dict(result))
+            except Exception as e:
+                reply({
+                    "type": "tool_response",
+                    "status": "error",
+                    "message": str(e)
+                })
+
+        elif message["type"] == "agent_message":
+            # Process message with GPT agent
+            try:
+                if message.get("stream", STREAM_AGENT_RESPONSES):
+                    # Forward deltas and tool call events, then the full response
+                    async def on_event(event: Dict[str, Any]):
+                        reply(event)
+
+                    response = await agent_sessions.process_message(
+                        client_id, message["content"], on_event=on_event
+                    )
+                    reply({
+                        "type": "response_done",
+                        "content": response
+                    })
+                else:
+                    response = await agent_sessions.process_message(client_id, message["content"])
+                    reply({
+                        "type": "response",
+                        "content": response
+                    })
+            except Exception as e:
+                logger.error(f"Error processing message with agent: {e}")
+                reply({
+                    "type": "error",
+                    "message": f"Error processing message: {str(e)}"
+                })
+        
+        elif message["type"] == "call_tools_batch":
+            calls = message.get("calls")
+            if not isinstance(calls, list) or not all(
+                isinstance(call, dict) and call.get("server") and call.get("tool") for call in calls
+            ):
+                reply({
+                    "type": "error",
+                    "message": "calls must be a list of entries with server and tool"
+                })
+                return
+            if len(calls) > MAX_BATCH_SIZE:
+                reply({
+                    "type": "error",
+                    "message": f"Batch too large: {len(calls)} calls, maximum is {MAX_BATCH_SIZE}"
+                })
+                return
+
+            parallelism = min(int(message.get("parallelism", BATCH_PARALLELISM)), BATCH_PARALLELISM)
+            if message.get("mode") == "stream":
+                # One frame per item as it completes, then a completion frame
+                await mcp_manager.call_tools_batch(
+                    calls, parallelism,
+                    on_result=lambda item: reply({"type": "tool_batch_item", **item})
+                )
+                reply({
+                    "type": "tool_batch_done",
+                    "count": len(calls)
+                })
+            else:
+                results = await mcp_manager.call_tools_batch(calls, parallelism)
+                reply({
+                    "type": "tool_batch_response",
+                    "status": "success",
+                    "results": results
+                })
+
+        else:
+            reply({
+                "type": "error",
+                "message": "Unknown message type"
+            })
+
+    except Exception as e:
+        logger.error(f"Error processing message from client {client_id}: {e}")
+        reply({
+            "type": "error",
+            "message": str(e)
+        })
+
+def negotiate_subprotocol(websocket: WebSocket) -> Optional[str]:
+    """Pick the msgpack subprotocol when the client offers it and it is available, JSON otherwise"""
+    if MSGPACK_SUBPROTOCOL not in websocket.scope.get("subprotocols", []):
+        return None
+    if not ENABLE_MSGPACK or not msgpack_available():
+        logger.warning("Client requested the msgpack subprotocol but it is not available, using JSON")
+        return None
+    return MSGPACK_SUBPROTOCOL
+
+async def receive_frame(websocket: WebSocket, binary: bool) -> Dict[str, Any]:
+    """Read and decode the next client frame, MessagePack clients may still send JSON text frames"""
+    if websocket.application_state == WebSocketState.DISCONNECTED:
+        # Closed on our side (outbound queue overflow or failed send), receiving would raise RuntimeError
+        raise WebSocketDisconnect(1006)
+    if not binary:
+        return loads(await websocket.receive_text())
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("bytes") is not None:
+        return unpack(message["bytes"])
+    return loads(message["text"])
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     logger.info(f"New WebSocket connection request from client {client_id}")
-    await manager.connect(websocket, client_id)
+    subprotocol = negotiate_subprotocol(websocket)
+    binary = subprotocol == MSGPACK_SUBPROTOCOL
+    outbox = await manager.connect(websocket, client_id, subprotocol)
+
+    # Messages carrying a request_id run concurrently, up to this limit
+    slots = asyncio.Semaphore(MAX_CONCURRENT_MESSAGES)
+    tasks = set()
+
+    def make_reply(request_id: Optional[Any]) -> Callable[[Dict[str, Any]], bool]:
+        """Reply function echoing the request_id of the message being answered, replies are never dropped"""
+        def reply(frame: Dict[str, Any]) -> bool:
+            if request_id is not None:
+                frame["request_id"] = request_id
+            return outbox.put(frame, reply=True)
+        return reply
+
+    async def dispatch(message: Dict[str, Any], reply: Callable[[Dict[str, Any]], bool]):
+        try:
+            await handle_message(client_id, message, reply)
+        finally:
+            slots.release()
     
     try:
         # Send initial connection success
-        await websocket.send_json({
+        outbox.put({
             "type": "connection_established",
             "status": "connected",
             "client_id": client_id
@@ -434,90 +1047,58 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
         # Send available tools
         try:
             tools = await mcp_manager.get_tools()
-            agent.set_available_tools(tools)  # Update agent's tools
-            await websocket.send_json({
-                "type": "tools",
-                "tools": tools
-            })
+            agent.set_available_tools(tools, mcp_manager.tool_catalog.version)  # Update agent's tools
+            outbox.put(mcp_manager.tool_catalog.tools_frame())  # Encoded once per catalog version
             logger.info(f"Sent tools list to client {client_id}")
         except Exception as e:
             logger.error(f"Error getting tools for client {client_id}: {e}")
-            await websocket.send_json({
+            outbox.put({
                 "type": "error",
                 "message": "Failed to get available tools"
             })
         
-        while True:
+        # The outbound queue closes the socket when the client falls behind or a send fails
+        while not outbox.closed:
             try:
-                message = await websocket.receive_json()
+                message = await receive_frame(websocket, binary)
                 logger.info(f"Received message from client {client_id}: {message}")
-                
-                if message["type"] == "connect":
-                    server_name = message["server"]
-                    logger.info(f"Client {client_id} requesting connection to server {server_name}")
-                    
-                    try:
-                        await mcp_manager.connect_to_server(server_name)
-                        manager.add_server_connection(client_id, server_name)
-                        
-                        await websocket.send_json({
-                            "type": "connection_established",
-                            "server": server_name
-                        })
-                        
-                        # Update tools after new connection
-                        tools = await mcp_manager.get_tools()
-                        agent.set_available_tools(tools)  # Update agent's tools
-                        await websocket.send_json({
-                            "type": "tools",
-                            "tools": tools
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"Error connecting to server {server_name}: {e}")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": f"Error connecting to server: {str(e)}"
-                        })
-
-                elif message["type"] == "agent_message":
-                    # Process message with GPT agent
-                    try:
-                        response = await agent.process_message(message["content"])
-                        await websocket.send_json({
-                            "type": "response",
-                            "content": response
-                        })
-                    except Exception as e:
-                        logger.error(f"Error processing message with agent: {e}")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": f"Error processing message: {str(e)}"
-                        })
-                
-                else:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Unknown message type"
-                    })
+
+                request_id = message.get("request_id")
+                reply = make_reply(request_id)
+                if request_id is None:
+                    # Without a request_id replies can't be correlated, keep them in order
+                    await handle_message(client_id, message, reply)
+                    continue
+
+                # Wait for a free slot before reading more frames (backpressure)
+                await slots.acquire()
+                task = asyncio.create_task(dispatch(message, reply))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
                     
+            except WebSocketDisconnect:
+                raise
+
             except json.JSONDecodeError:
-                logger.error(f"Invalid JSON received from client {client_id}")
-                await websocket.send_json({
+                logger.error(f"Invalid frame received from client {client_id}")
+                outbox.put({
                     "type": "error",
                     "message": "Invalid message format"
-                })
+                }, reply=True)
                 
             except Exception as e:
                 logger.error(f"Error processing message from client {client_id}: {e}")
-                await websocket.send_json({
+                outbox.put({
                     "type": "error",
                     "message": str(e)
-                })
+                }, reply=True)
                 
     except WebSocketDisconnect:
         logger.info(f"Client {client_id} disconnected")
-        manager.disconnect(websocket)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await manager.disconnect(websocket)
         
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,197 @@
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class MCPClientPool:
+    """
+    Pool of identical MCP server processes behind a single server name.
+    Exposes the same interface as MCPClient: calls are routed to the replica
+    with the fewest outstanding requests, a replica is added when every
+    replica is saturated, and replicas above the minimum are reaped once idle.
+    """
+
+    def __init__(self, server_name: str, client_factory: Callable[[], Any],
+                 min_replicas: int = 1, max_replicas: int = 1,
+                 initial_replicas: Optional[int] = None, idle_timeout: float = 300.0):
+        """
+        Args:
+            server_name: Name of the MCP server, used for logging
+            client_factory: Creates a new, unconnected MCPClient
+            min_replicas: Replicas kept alive even when idle
+            max_replicas: Upper bound for autoscaling
+            initial_replicas: Replicas started by connect(), defaults to min_replicas
+            idle_timeout: Seconds without traffic before an extra replica is reaped
+        """
+        self.server_name = server_name
+        self.client_factory = client_factory
+        self.min_replicas = max(1, min_replicas)
+        self.max_replicas = max(self.min_replicas, max_replicas)
+        initial = initial_replicas if initial_replicas is not None else self.min_replicas
+        self.initial_replicas = min(max(initial, self.min_replicas), self.max_replicas)
+        self.idle_timeout = idle_timeout
+        self.replicas: List[Any] = []
+        self._last_used: Dict[int, float] = {}  # id(replica) -> monotonic time
+        self._lock = asyncio.Lock()
+        self._scaling: Optional[asyncio.Task] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        """Async context manager entry"""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit"""
+        await self.close()
+
+    @property
+    def session(self):
+        """Session of the first connected replica, None if none is connected"""
+        for replica in self.replicas:
+            if replica.session:
+                return replica.session
+        return None
+
+    @property
+    def in_flight(self) -> int:
+        """Requests awaiting a response across all replicas"""
+        return sum(replica.in_flight for replica in self.replicas)
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a free slot across all replicas"""
+        return sum(replica.queued for replica in self.replicas)
+
+    async def connect(self):
+        """Start replicas until the pool has its initial size"""
+        async with self._lock:
+            self.replicas = [replica for replica in self.replicas if replica.session]
+            missing = self.initial_replicas - len(self.replicas)
+            if missing > 0:
+                new_replicas = [self.client_factory() for _ in range(missing)]
+                results = await asyncio.gather(
+                    *(replica.connect() for replica in new_replicas),
+                    return_exceptions=True
+                )
+                errors = []
+                for replica, result in zip(new_replicas, results):
+                    if isinstance(result, BaseException):
+                        errors.append(result)
+                        logger.error(f"Failed to start replica of {self.server_name}: {result}")
+                    else:
+                        self._add(replica)
+                if not self.replicas:
+                    raise errors[0]
+
+        if self.max_replicas > self.min_replicas and not self._reaper:
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def close(self):
+        """Stop autoscaling and close every replica"""
+        for task in (self._scaling, self._reaper):
+            if task and not task.done():
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._scaling, self._reaper) if task),
+            return_exceptions=True
+        )
+        self._scaling = None
+        self._reaper = None
+
+        replicas, self.replicas = self.replicas, []
+        self._last_used.clear()
+        results = await asyncio.gather(
+            *(replica.close() for replica in replicas),
+            return_exceptions=True
+        )
+        errors = [str(result) for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception("; ".join(errors))
+
+    async def get_available_tools(self) -> List[Any]:
+        """List available tools, replicas all expose the same ones"""
+        replica = self._pick()
+        if replica is None:
+            raise RuntimeError("Not connected to MCP server")
+        return await replica.get_available_tools()
+
+    async def call_tool(self, tool_name: str, arguments: Dict) -> Any:
+        """Call a tool on the least loaded replica"""
+        replica = self._pick()
+        if replica is None:
+            raise RuntimeError("Not connected to MCP server")
+
+        if replica.in_flight + replica.queued >= replica.max_in_flight:
+            # Even the least loaded replica would queue this request
+            self._scale_up()
+
+        self._last_used[id(replica)] = time.monotonic()
+        try:
+            return await replica.call_tool(tool_name, arguments)
+        finally:
+            self._last_used[id(replica)] = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per replica load, for monitoring"""
+        return {
+            'replicas': len(self.replicas),
+            'min': self.min_replicas,
+            'max': self.max_replicas,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'load': [replica.in_flight + replica.queued for replica in self.replicas]
+        }
+
+    def _pick(self) -> Optional[Any]:
+        """Least outstanding requests routing"""
+        connected = [replica for replica in self.replicas if replica.session]
+        if not connected:
+            return None
+        return min(connected, key=lambda replica: replica.in_flight + replica.queued)
+
+    def _add(self, replica: Any) -> None:
+        self.replicas.append(replica)
+        self._last_used[id(replica)] = time.monotonic()
+
+    def _scale_up(self) -> None:
+        """Start one more replica in the background if allowed"""
+        if len(self.replicas) >= self.max_replicas:
+            return
+        if self._scaling and not self._scaling.done():
+            return
+        self._scaling = asyncio.create_task(self._add_replica())
+
+    async def _add_replica(self):
+        logger.info(f"Scaling {self.server_name} to {len(self.replicas) + 1} replicas")
+        replica = self.client_factory()
+        try:
+            await replica.connect()
+        except Exception as e:
+            logger.error(f"Failed to start replica of {self.server_name}: {e}")
+            return
+        async with self._lock:
+            self._add(replica)
+
+    async def _reap_idle(self):
+        """Close replicas above the minimum that have been idle too long"""
+        interval = max(1.0, self.idle_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for replica in list(self.replicas):
+                if len(self.replicas) <= self.min_replicas:
+                    break
+                if replica.in_flight or replica.queued:
+                    continue
+                if now - self._last_used.get(id(replica), now) < self.idle_timeout:
+                    continue
+                self.replicas.remove(replica)
+                self._last_used.pop(id(replica), None)
+                logger.info(f"Reaping idle replica of {self.server_name} ({len(self.replicas)} left)")
+                try:
+                    await replica.close()
+                except Exception as e:
+                    logger.error(f"Error closing replica of {self.server_name}: {e}")
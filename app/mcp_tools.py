@@ -1,91 +1,117 @@
-from typing import Any, List, Dict
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from typing import Any, List, Dict, Optional, Set, Tuple
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
-class MCPClient:
-    def __init__(self, server_params: StdioServerParameters):
-        self.server_params = server_params
-        self.session = None
-        self._client = None
-        
-    async def __aenter__(self):
-        """Async context manager entry"""
-        await self.connect()
-        return self
-        
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.session:
-            await self.session.__aexit__(exc_type, exc_val, exc_tb)
-        if self._client:
-            await self._client.__aexit__(exc_type, exc_val, exc_tb)
-
-    async def connect(self):
-        """Establishes connection to MCP server"""
-        self._client = stdio_client(self.server_params)
-        self.read, self.write = await self._client.__aenter__()
-        session = ClientSession(self.read, self.write)
-        self.session = await session.__aenter__()
-        await self.session.initialize()
-
-    async def get_available_tools(self) -> List[Any]:
-        """List available tools"""
-        if not self.session:
-            raise RuntimeError("Not connected to MCP server")
-            
-        tools = await self.session.list_tools()
-        _, tools_list = tools
-        _, tools_list = tools_list
-        return tools_list
+# OpenAI function names: letters, digits, underscores and dashes, at most 64 characters
+_FUNCTION_NAME = re.compile(r"[a-zA-Z0-9_-]{1,64}")
+_FUNCTION_NAME_ILLEGAL = re.compile(r"[^a-zA-Z0-9_-]")
+MAX_FUNCTION_NAME_LENGTH = 64
 
-    async def call_tool(self, tool_name: str, arguments: dict) -> Any:
-        """Call a tool with given arguments"""
-        if not self.session:
-            raise RuntimeError("Not connected to MCP server")
-            
-        result = await self.session.call_tool(tool_name, arguments=arguments)
-        return result
+def _unique_function_name(name: str, taken: Set[str]) -> str:
+    """API-legal version of name that is not in taken"""
+    name = _FUNCTION_NAME_ILLEGAL.sub("_", name)[:MAX_FUNCTION_NAME_LENGTH] or "tool"
+    candidate = name
+    suffix = 2
+    while candidate in taken:
+        candidate = f"{name[:MAX_FUNCTION_NAME_LENGTH - len(str(suffix)) - 1]}_{suffix}"
+        suffix += 1
+    return candidate
 
 class MCPToolManager:
-    def __init__(self):
+    def __init__(self, connection_pool: Optional[Any] = None):
+        """
+        Args:
+            connection_pool: Process-wide owner of the MCP server connections,
+                anything with an async call_tool(server_name, tool_name, arguments,
+                tool_use_id) such as MCPManager
+        """
         self.tools = []
-        self.mcp_clients: Dict[str, MCPClient] = {}
+        self.connection_pool = connection_pool
+        self._routes: Dict[str, Dict[str, Any]] = {}  # tool name or server.tool -> route
+        self.duplicate_names: Dict[str, List[str]] = {}  # tool name -> servers exposing it
+        self.function_names: Dict[Tuple[str, str], str] = {}  # (server, tool) -> name exposed to the model
+        self.lookup_stats = {'hits': 0, 'misses': 0}
         
+    def set_connection_pool(self, connection_pool: Any):
+        """Attach the shared MCP connection pool used to execute tools"""
+        self.connection_pool = connection_pool
+
     def update_tools(self, tools: List[Dict[str, Any]]):
-        """Update the list of available tools"""
+        """
+        Update the list of available tools and rebuild the routing index
+
+        Every tool is reachable by its qualified "server.tool" name. A bare
+        tool name exposed by several servers routes to the first of those
+        servers in alphabetical order.
+
+        Each tool also gets a unique, API-legal function name for the model:
+        its bare name, or "server__tool" when several servers expose it.
+        """
         self.tools = tools
+        ordered = sorted(tools, key=lambda t: (t["serverName"], t["name"]))
+        routes: Dict[str, Dict[str, Any]] = {}
+        servers_by_name: Dict[str, List[str]] = {}
+        for tool in ordered:
+            route = {
+                'server': tool["serverName"],
+                'tool': tool["name"],
+                'input_schema': tool.get("input_schema")
+            }
+            routes[f"{tool['serverName']}.{tool['name']}"] = route
+            routes.setdefault(tool["name"], route)
+            servers_by_name.setdefault(tool["name"], []).append(tool["serverName"])
+
+        self.duplicate_names = {
+            name: servers for name, servers in servers_by_name.items() if len(servers) > 1
+        }
+        for name, servers in self.duplicate_names.items():
+            logger.warning(f"Tool {name} is exposed by {', '.join(servers)}, routing to {servers[0]}")
+
+        function_names: Dict[Tuple[str, str], str] = {}
+        taken = set(servers_by_name)
+        for tool in ordered:
+            name = tool["name"]
+            if name in self.duplicate_names or not _FUNCTION_NAME.fullmatch(name):
+                qualified = f"{tool['serverName']}__{name}" if name in self.duplicate_names else name
+                name = _unique_function_name(qualified, taken)
+                taken.add(name)
+                routes[name] = routes[f"{tool['serverName']}.{tool['name']}"]
+            function_names[(tool["serverName"], tool["name"])] = name
+        self.function_names = function_names
+        self._routes = routes
+
+    def function_name(self, server_name: str, tool_name: str) -> str:
+        """Unique function name under which the model sees a tool"""
+        return self.function_names.get((server_name, tool_name), tool_name)
+
+    def resolve(self, tool_name: str) -> Optional[Dict[str, Any]]:
+        """Route of a tool name or qualified server.tool name"""
+        route = self._routes.get(tool_name)
+        self.lookup_stats['hits' if route else 'misses'] += 1
+        return route
+
+    def get_lookup_stats(self) -> Dict[str, int]:
+        """Routing index size and lookup counters"""
+        return {
+            'routes': len(self._routes),
+            'duplicate_names': len(self.duplicate_names),
+            **self.lookup_stats
+        }
         
     async def execute_tool(self, tool_request: Dict[str, Any]) -> Any:
         """Execute a tool request"""
-        tool_name = tool_request["name"]
         tool_input = tool_request.get("input", {})
         
         # Find the server for this tool
-        server_name = None
-        for tool in self.tools:
-            if tool["name"] == tool_name:
-                server_name = tool["serverName"]
-                break
-                
-        if not server_name:
-            raise ValueError(f"Tool {tool_name} not found")
-            
-        # Get or create MCP client for this server
-        if server_name not in self.mcp_clients:
-            server_params = self._get_server_params(server_name)
-            client = MCPClient(server_params)
-            await client.connect()
-            self.mcp_clients[server_name] = client
-            
-        client = self.mcp_clients[server_name]
-        return await client.call_tool(tool_name, tool_input)
-        
-    def _get_server_params(self, server_name: str) -> StdioServerParameters:
-        """Get server parameters for a given server name"""
-        return StdioServerParameters(
-            command=["python", "-m", "mcp.server"],
-            cwd=f"/Users/younesbami/Projects/claude/servers/src/{server_name}"
+        route = self.resolve(tool_request["name"])
+        if not route:
+            raise ValueError(f"Tool {tool_request['name']} not found")
+        if self.connection_pool is None:
+            raise RuntimeError("No MCP connection pool attached")
+
+        # Reuse the server processes owned by the connection pool
+        return await self.connection_pool.call_tool(
+            route['server'], route['tool'], tool_input, tool_request.get("toolUseId")
         )
@@ -0,0 +1,172 @@
+from typing import Any, Awaitable, Callable, Optional
+from collections import deque
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies, applied when the queue is full. Replies to client
+# requests are never dropped: a push arriving when the queue is full of
+# replies is dropped itself, a reply arriving then disconnects the client
+# whatever the policy.
+DROP_OLDEST = "drop_oldest"  # Drop the oldest untagged frame to make room
+COALESCE = "coalesce"  # Drop superseded tool list pushes first, then the oldest untagged frame
+DISCONNECT = "disconnect"  # Close the connection of a client that cannot keep up
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Frame types where only the latest queued server push matters
+COALESCIBLE_TYPES = {"tools"}
+
+def _frame_type(message: Any) -> Optional[str]:
+    """Type of a frame dict or of a pre-encoded frame"""
+    if isinstance(message, dict):
+        return message.get("type")
+    return getattr(message, "type", None)
+
+def _is_reply(message: Any) -> bool:
+    """Whether a frame carries a request_id, so it answers a client request and must be delivered"""
+    return isinstance(message, dict) and message.get("request_id") is not None
+
+class OutboundQueue:
+    """
+    Bounded queue of frames to send to one WebSocket client, drained by a
+    dedicated writer task so a slow consumer never blocks message handling.
+    Frames are encoded when queued, so encoding errors reach the sender
+    instead of the writer.
+    """
+
+    def __init__(self, client_id: str, send: Callable[[Any], Awaitable[None]],
+                 close: Callable[[], Awaitable[None]], max_size: int = 256,
+                 overflow_policy: str = DROP_OLDEST, encode: Callable[[Any], Any] = lambda frame: frame,
+                 abort: Optional[Callable[[], Awaitable[None]]] = None):
+        """
+        Args:
+            client_id: Client the queue belongs to, used for logging
+            send: Sends one encoded frame on the socket
+            close: Closes the socket of a client that fell behind (disconnect policy, queue full of replies)
+            max_size: Maximum number of queued frames
+            overflow_policy: One of OVERFLOW_POLICIES
+            encode: Encodes a frame for send, may raise
+            abort: Closes the socket when sending fails, defaults to close
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.client_id = client_id
+        self._send = send
+        self._close = close
+        self._abort = abort or close
+        self._encode = encode
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self._queue: deque = deque()  # (frame type, is reply, encoded frame), oldest first
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.stats = {'sent': 0, 'dropped': 0, 'coalesced': 0, 'max_depth': 0}
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        """Start the writer task"""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    def put(self, message: Any, reply: bool = False) -> bool:
+        """
+        Queue a frame without waiting
+
+        Args:
+            message: Frame to send
+            reply: Whether the frame answers a client request, replies are
+                never dropped. Frames carrying a request_id always are.
+
+        Returns:
+            False if the frame was not queued because the queue is closed,
+            the client was disconnected for falling behind or the frame is
+            a server push dropped to make room
+
+        Raises:
+            Whatever encode raises for a frame that cannot be encoded
+        """
+        if self.closed:
+            return False
+        data = self._encode(message)
+        message_type = _frame_type(message)
+        reply = reply or _is_reply(message)
+
+        if len(self._queue) >= self.max_size and not self._make_room(message_type, reply):
+            if not reply and self.overflow_policy != DISCONNECT:
+                # Only replies are queued, drop the push rather than the client
+                self.stats['dropped'] += 1
+                return False
+            logger.warning(f"Send queue of client {self.client_id} is full, disconnecting")
+            self.closed = True
+            self._close_task = asyncio.create_task(self._close())
+            self._ready.set()
+            return False
+
+        self._queue.append((message_type, reply, data))
+        self.stats['max_depth'] = max(self.stats['max_depth'], len(self._queue))
+        self._ready.set()
+        return True
+
+    async def close(self) -> None:
+        """Stop the writer, discarding frames that were not sent"""
+        self.closed = True
+        self._queue.clear()
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+
+    def _make_room(self, message_type: Optional[str], reply: bool) -> bool:
+        """Apply the overflow policy to a full queue, returns False if the client must be disconnected"""
+        if self.overflow_policy == DISCONNECT:
+            return False
+
+        if (self.overflow_policy == COALESCE and message_type in COALESCIBLE_TYPES
+                and not reply and self._drop_superseded(message_type)):
+            return True
+
+        for i, (_, queued_reply, _) in enumerate(self._queue):
+            if not queued_reply:
+                del self._queue[i]
+                self.stats['dropped'] += 1
+                return True
+        return False
+
+    def _drop_superseded(self, message_type: str) -> int:
+        """Remove queued server pushes of a type superseded by a newer one, returns how many"""
+        kept = deque(
+            entry for entry in self._queue
+            if entry[1] or entry[0] != message_type
+        )
+        coalesced = len(self._queue) - len(kept)
+        self.stats['coalesced'] += coalesced
+        self._queue = kept
+        return coalesced
+
+    async def _run(self) -> None:
+        while not self.closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            _, _, data = self._queue.popleft()
+            try:
+                await self._send(data)
+                self.stats['sent'] += 1
+            except Exception as e:
+                logger.info(f"Stopped sending to client {self.client_id}: {e}")
+                self.closed = True
+                self._queue.clear()
+                # Close the socket so the client notices instead of waiting forever
+                try:
+                    await self._abort()
+                except Exception:
+                    pass
@@ -0,0 +1,138 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+import time
+from app.codec import dumps
+
+logger = logging.getLogger(__name__)
+
+def call_key(server_name: str, tool_name: str, arguments: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Key identifying a tool call, with arguments canonicalized"""
+    return (
+        server_name,
+        tool_name,
+        json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+    )
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into a single upstream request.
+    The first caller for a key starts the call in its own task, callers that
+    arrive while it is in flight await the same task and share its result.
+    Callers must not mutate the shared result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func for key, or join the call already in flight for it"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats['shared'] += 1
+        else:
+            self.stats['calls'] += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shield so a cancelled caller does not cancel the call for the others
+        return await asyncio.shield(task)
+
+class ToolResultCache:
+    """
+    TTL cache of tool results with LRU eviction, bounded by entry count and
+    by the approximate JSON size of the cached results. Entries are tracked
+    per server so a write on a server can invalidate its cached reads, and
+    each invalidation bumps the server's generation so reads started before
+    it are not cached afterwards.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 10_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, int, Any]]" = OrderedDict()
+        self._by_server: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}  # server -> invalidation count
+        self._bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Any]:
+        """Cached result for a call key, None on a miss or once expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        expires_at, _, result = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return result
+
+    def generation(self, server_name: str) -> int:
+        """Current generation of a server, to pass to put for a call about to start"""
+        return self._generations.get(server_name, 0)
+
+    def put(self, key: Tuple[str, str, str], result: Any, ttl: float,
+            generation: Optional[int] = None) -> None:
+        """Cache a result for ttl seconds, unless the server was invalidated since generation"""
+        if generation is not None and generation != self.generation(key[0]):
+            return
+        try:
+            size = len(dumps(result))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, result)
+        self._by_server.setdefault(key[0], set()).add(key)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats['evictions'] += 1
+
+    def invalidate_server(self, server_name: str) -> int:
+        """Drop every cached result of a server, returns how many"""
+        self._generations[server_name] = self.generation(server_name) + 1
+        keys = self._by_server.pop(server_name, None)
+        if not keys:
+            return 0
+        for key in keys:
+            _, size, _ = self._entries.pop(key)
+            self._bytes -= size
+        self.stats['invalidations'] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_server.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Tuple[str, str, str]) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_server.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_server[key[0]]
@@ -0,0 +1,125 @@
+from typing import Dict, Any, Optional, List
+import hashlib
+import logging
+from app.codec import dumps, EncodedFrame
+
+logger = logging.getLogger(__name__)
+
+def _is_read_only(tool: Any) -> bool:
+    """Whether a tool is annotated readOnlyHint, as a ToolAnnotations model or as the dict older mcp versions keep"""
+    annotations = getattr(tool, 'annotations', None)
+    if isinstance(annotations, dict):
+        return bool(annotations.get('readOnlyHint'))
+    return bool(getattr(annotations, 'readOnlyHint', False))
+
+class ToolCatalog:
+    """
+    Versioned in-memory catalog of the tools exposed by each MCP server.
+    The catalog is filled when a server connects and only changes when a
+    server reports a new tool list, so readers can serve it without
+    touching the MCP servers.
+    """
+
+    def __init__(self):
+        self._servers: Dict[str, List[Dict[str, Any]]] = {}
+        self._read_only: Dict[str, set] = {}  # server -> tools annotated readOnlyHint
+        self.version = 0
+        # Snapshot of the whole catalog, rebuilt lazily once per version
+        self._snapshot_version = -1
+        self._tools: List[Dict[str, Any]] = []
+        self._encoded = b"[]"
+        self._etag = ""
+        self._frame: Optional[EncodedFrame] = None
+
+    def set_server_tools(self, server_name: str, tools: List[Any]) -> bool:
+        """
+        Replace the tools of a server
+
+        Args:
+            server_name: Name of the MCP server
+            tools: Tool objects returned by the server's list_tools
+
+        Returns:
+            True if the catalog changed and its version was bumped
+        """
+        formatted = [
+            {
+                'name': tool.name,
+                'serverName': server_name,
+                'description': tool.description,
+                'input_schema': tool.inputSchema
+            }
+            for tool in tools
+        ]
+        self._read_only[server_name] = {tool.name for tool in tools if _is_read_only(tool)}
+        if self._servers.get(server_name) == formatted:
+            return False
+
+        self._servers[server_name] = formatted
+        self.version += 1
+        logger.info(f"Tool catalog updated for {server_name} (version {self.version})")
+        return True
+
+    def remove_server(self, server_name: str) -> bool:
+        """Drop a server's tools from the catalog"""
+        self._read_only.pop(server_name, None)
+        if self._servers.pop(server_name, None) is None:
+            return False
+        self.version += 1
+        return True
+
+    def has_server(self, server_name: str) -> bool:
+        """Whether the server's tools are in the catalog"""
+        return server_name in self._servers
+
+    def is_read_only(self, server_name: str, tool_name: str) -> bool:
+        """Whether the server annotated the tool with readOnlyHint"""
+        return tool_name in self._read_only.get(server_name, ())
+
+    def get_tools(self, server_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the catalog's tools, optionally filtered by server"""
+        if server_name is not None:
+            return self._servers.get(server_name, [])
+        self._refresh_snapshot()
+        return self._tools
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag of the whole catalog, derived from its content"""
+        self._refresh_snapshot()
+        return self._etag
+
+    def encoded(self) -> bytes:
+        """JSON encoded tool list, serialized once per catalog version"""
+        self._refresh_snapshot()
+        return self._encoded
+
+    def tools_frame(self) -> EncodedFrame:
+        """Pre-encoded {"type": "tools", "tools": [...]} WebSocket frame"""
+        self._refresh_snapshot()
+        if self._frame is None:
+            self._frame = EncodedFrame.wrap("tools", "tools", self._encoded)
+        return self._frame
+
+    def matches_etag(self, if_none_match: Optional[str]) -> bool:
+        """Check an If-None-Match header value against the current ETag"""
+        if not if_none_match:
+            return False
+        etag = self.etag
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == "*" or candidate == etag:
+                return True
+        return False
+
+    def _refresh_snapshot(self) -> None:
+        """Rebuild the flattened list, encoded body and ETag if stale"""
+        if self._snapshot_version == self.version:
+            return
+        self._tools = [tool for tools in self._servers.values() for tool in tools]
+        self._encoded = dumps(self._tools)
+        self._frame = None
+        self._etag = f'"{hashlib.sha1(self._encoded).hexdigest()}"'
+        self._snapshot_version = self.version
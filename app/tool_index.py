@@ -0,0 +1,121 @@
+from typing import Any, Dict, Iterable, List, Optional
+from collections import Counter
+import logging
+import math
+import re
+from app.codec import dumps
+
+logger = logging.getLogger(__name__)
+
+_CAMEL_CASE = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text, splitting camelCase and snake_case identifiers"""
+    return _WORD.findall(_CAMEL_CASE.sub(r"\1 \2", text or "").lower())
+
+class ToolIndex:
+    """
+    BM25 index over tool names, descriptions and schema property names.
+    Used to send the model only the tools relevant to a message instead of
+    the whole catalog, without any external dependency.
+    """
+
+    K1 = 1.5
+    B = 0.75
+    NAME_WEIGHT = 2  # Name tokens count this many times
+
+    def __init__(self, tools: Iterable[Dict[str, Any]] = (), counters: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            tools: OpenAI tool definitions ({"type": "function", "function": {...}})
+            counters: Counters to keep updating, so they survive index rebuilds
+        """
+        self.tools: List[Dict[str, Any]] = list(tools)
+        self._names = [tool["function"]["name"] for tool in self.tools]
+        self._token_costs = [len(dumps(tool)) // 4 for tool in self.tools]
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[tuple]] = {}  # term -> [(tool index, term frequency)]
+
+        for i, tool in enumerate(self.tools):
+            function = tool["function"]
+            properties = (function.get("parameters") or {}).get("properties") or {}
+            terms = tokenize(function["name"]) * self.NAME_WEIGHT
+            terms += tokenize(function.get("description") or "")
+            for name in properties:
+                terms += tokenize(name)
+            self._lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self._postings.setdefault(term, []).append((i, frequency))
+
+        count = len(self.tools)
+        self._avg_length = (sum(self._lengths) / count) if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+        self.counters = counters if counters is not None else {
+            'queries': 0,
+            'tools_sent': 0,
+            'tools_skipped': 0,
+            'tokens_saved': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def scores(self, query: str) -> List[float]:
+        """BM25 score of every tool for a query"""
+        scores = [0.0] * len(self.tools)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for i, frequency in postings:
+                norm = self.K1 * (1 - self.B + self.B * self._lengths[i] / self._avg_length)
+                scores[i] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return scores
+
+    def select(self, query: str, k: int, always_include: Optional[Iterable[str]] = None,
+               min_tools: int = 0) -> List[Dict[str, Any]]:
+        """
+        Top-k tool definitions for a query, in catalog order
+
+        Fewer than k matches are topped up with the other tools in catalog
+        order, and tools listed in always_include are added on top. When
+        nothing matches the query every tool is returned, as the model may
+        still need one. Catalogs of at most min_tools tools are always
+        returned whole.
+        """
+        counters = self.counters
+        counters['queries'] += 1
+        if k <= 0 or len(self.tools) <= max(k, min_tools):
+            counters['tools_sent'] += len(self.tools)
+            return self.tools
+
+        scores = self.scores(query)
+        ranked = sorted((i for i in range(len(scores)) if scores[i] > 0),
+                        key=lambda i: scores[i], reverse=True)
+        if not ranked:
+            counters['tools_sent'] += len(self.tools)
+            return self.tools
+
+        selected = set(ranked[:k])
+        # Keyword matches can miss tools the task needs, fill up to k
+        for i in range(len(self.tools)):
+            if len(selected) >= k:
+                break
+            selected.add(i)
+        pinned = set(always_include or ())
+        selected.update(i for i, name in enumerate(self._names) if name in pinned)
+
+        counters['tools_sent'] += len(selected)
+        counters['tools_skipped'] += len(self.tools) - len(selected)
+        counters['tokens_saved'] += sum(cost for i, cost in enumerate(self._token_costs) if i not in selected)
+        return [tool for i, tool in enumerate(self.tools) if i in selected]
+
+    def stats(self) -> Dict[str, int]:
+        """Selection counters"""
+        return {'tools': len(self.tools), **self.counters}
@@ -2,7 +2,9 @@ from typing import Dict, Any, Optional, List
 import logging
 import json
 from dataclasses import dataclass
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError, SchemaError
+from jsonschema.validators import validator_for
+from app.execution_history import ExecutionHistory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,15 +17,69 @@ class ToolResponse:
     content: List[Dict[str, str]]  # Changed to match reference format
     status: str  # 'success' or 'error'
 
+# Schema keys that do not constrain an object instance
+_ANNOTATION_KEYS = {'type', '$schema', '$id', 'title', 'description'}
+
+def _is_trivial_object_schema(schema: Dict[str, Any]) -> bool:
+    """True for schemas like {"type": "object"} that accept any object"""
+    if not isinstance(schema, dict) or schema.get('type') != 'object':
+        return False
+    extra = set(schema) - _ANNOTATION_KEYS
+    # An empty properties map without other keywords constrains nothing
+    if extra == {'properties'} and not schema['properties']:
+        return True
+    return not extra
+
+class _InvalidSchemaValidator:
+    """Stand-in validator for a tool whose schema is invalid, failing each call"""
+
+    def __init__(self, error: SchemaError):
+        self.error = error
+
+    def validate(self, instance: Any) -> None:
+        raise self.error
+
+def compile_validator(schema: Dict[str, Any], fast_path: bool = True) -> Optional[Any]:
+    """
+    Build a reusable validator for a JSON schema
+
+    Args:
+        schema: JSON schema to compile
+        fast_path: Skip compiling trivial object schemas
+
+    Returns:
+        A jsonschema validator, or None when the schema is a trivial object
+        schema and only an isinstance check is needed. An invalid schema
+        gives a validator raising its SchemaError, so only calls to that
+        tool fail.
+    """
+    if fast_path and _is_trivial_object_schema(schema):
+        return None
+    validator_cls = validator_for(schema)
+    try:
+        validator_cls.check_schema(schema)
+    except SchemaError as e:
+        return _InvalidSchemaValidator(e)
+    return validator_cls(schema)
+
 class WebSocketToolManager:
     """
     Manages tool registration, validation, and execution for WebSocket server.
     Provides a standardized interface for tool operations.
     """
     
-    def __init__(self):
+    def __init__(self, validation_fast_path: bool = True,
+                 history_size: int = 1000, history_max_bytes: int = 1_000_000):
+        """
+        Args:
+            validation_fast_path: Replace full validation of trivial
+                {"type": "object"} schemas by an isinstance check
+            history_size: Maximum number of executions kept in the history
+            history_max_bytes: Approximate byte budget for recorded inputs
+        """
         self._tools: Dict[str, Dict[str, Any]] = {}
-        self._execution_history: List[Dict[str, Any]] = []
+        self._validation_fast_path = validation_fast_path
+        self._execution_history = ExecutionHistory(history_size, history_max_bytes)
 
     def register_tool(self, name: str, func: callable, description: str, input_schema: Dict[str, Any]) -> None:
         """
@@ -35,13 +91,23 @@ class WebSocketToolManager:
             description: Tool description
             input_schema: JSON schema for input validation
         """
-        if name in self._tools:
+        existing = self._tools.get(name)
+        if existing:
             logger.warning(f"Tool {name} already registered. Overwriting.")
+
+        # Only recompile the validator when the schema actually changed
+        if existing and existing['input_schema'] == input_schema:
+            validator = existing['validator']
+        else:
+            validator = compile_validator(input_schema, self._validation_fast_path)
+            if isinstance(validator, _InvalidSchemaValidator):
+                logger.error(f"Tool {name} has an invalid input schema, its calls will fail: {validator.error.message}")
             
         self._tools[name] = {
             'function': func,
             'description': description,
-            'input_schema': input_schema
+            'input_schema': input_schema,
+            'validator': validator
         }
         logger.info(f"Registered tool: {name}")
 
@@ -62,6 +128,30 @@ class WebSocketToolManager:
             for name, tool in self._tools.items()
         ]
 
+    def has_tool(self, name: str) -> bool:
+        """Whether a tool is registered"""
+        return name in self._tools
+
+    def validate_input(self, tool_name: str, tool_input: Any) -> None:
+        """
+        Validate a tool's input with the validator compiled at registration
+
+        Raises:
+            ValueError: If the tool is not registered
+            ValidationError: If the input does not match the tool's schema
+            SchemaError: If the tool's own schema is invalid
+        """
+        # Validate tool exists
+        if tool_name not in self._tools:
+            raise ValueError(f"Unknown tool: {tool_name}")
+
+        validator = self._tools[tool_name]['validator']
+        if validator is None:
+            if not isinstance(tool_input, dict):
+                raise ValidationError(f"{tool_input!r} is not of type 'object'")
+        else:
+            validator.validate(tool_input)
+
     async def execute_tool(self, tool_request: Dict[str, Any]) -> ToolResponse:
         """
         Execute a tool with validation and error handling
@@ -80,23 +170,24 @@ class WebSocketToolManager:
         tool_input = tool_request.get('input', {})
 
         # Log execution request
-        self._execution_history.append({
-            'toolUseId': tool_use_id,
-            'tool_name': tool_name,
-            'input': tool_input,
-            'timestamp': 'timestamp'  # TODO: Add actual timestamp
-        })
+        entry = self.start_execution(tool_use_id, tool_name, tool_input)
+        response = await self._execute(tool_use_id, tool_name, tool_input)
+        self.finish_execution(entry, response.status)
+        return response
 
-        try:
-            # Validate tool exists
-            if tool_name not in self._tools:
-                raise ValueError(f"Unknown tool: {tool_name}")
+    def start_execution(self, tool_use_id: str, tool_name: str, tool_input: Any) -> Dict[str, Any]:
+        """Record a pending execution in the history, for calls made outside execute_tool"""
+        return self._execution_history.record(tool_use_id, tool_name, tool_input)
 
-            tool = self._tools[tool_name]
-            
-            # Validate input against schema
+    def finish_execution(self, entry: Dict[str, Any], status: str) -> None:
+        """Record the outcome of an execution returned by start_execution"""
+        self._execution_history.complete(entry, status)
+
+    async def _execute(self, tool_use_id: str, tool_name: str, tool_input: Dict[str, Any]) -> ToolResponse:
+        """Validate and run a tool, converting failures into error responses"""
+        try:
             try:
-                validate(instance=tool_input, schema=tool['input_schema'])
+                self.validate_input(tool_name, tool_input)
             except ValidationError as e:
                 return ToolResponse(
                     toolUseId=tool_use_id,
@@ -105,7 +196,7 @@ class WebSocketToolManager:
                 )
 
             # Execute tool
-            result = await tool['function'](tool_name, tool_input)
+            result = await self._tools[tool_name]['function'](tool_input)
             
             return ToolResponse(
                 toolUseId=tool_use_id,
@@ -121,9 +212,22 @@ class WebSocketToolManager:
                 status='error'
             )
 
-    def get_execution_history(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get recent tool execution history"""
-        return self._execution_history[-limit:]
+    def get_execution_history(self, limit: int = 100, tool_name: Optional[str] = None,
+                              since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Get recent tool execution history, oldest first
+
+        Args:
+            limit: Maximum number of entries
+            tool_name: Only return executions of this tool
+            since: Only return executions started at or after this epoch time
+            until: Only return executions started at or before this epoch time
+        """
+        return self._execution_history.query(limit, tool_name, since, until)
+
+    def get_execution(self, tool_use_id: str) -> Optional[Dict[str, Any]]:
+        """Get the latest execution recorded for a toolUseId"""
+        return self._execution_history.get(tool_use_id)
 
     def clear_history(self) -> None:
         """Clear execution history"""
@@ -0,0 +1,92 @@
+"""
+Microbenchmark of app.codec under each installed JSON_CODEC backend, on the
+frame shapes the server actually sends and receives.
+
+Usage: python benchmarks/codec_bench.py [iterations]
+"""
+import importlib
+import logging
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import app.codec
+
+BACKENDS = ("json", "orjson", "msgspec")
+
+def make_frames():
+    """Representative frames, modelled on the filesystem server's tools and results"""
+    tool = {
+        "name": "read_file",
+        "serverName": "filesystem",
+        "description": "Read the complete contents of a file from the file system. " * 3,
+        "input_schema": {
+            "type": "object",
+            "properties": {"path": {"type": "string"}, "encoding": {"type": "string"}},
+            "required": ["path"]
+        }
+    }
+    listing = "\n".join(f"[FILE] document_{i:04d}.txt" for i in range(500))
+    return {
+        "tools": {"type": "tools", "tools": [dict(tool, name=f"tool_{i}") for i in range(40)]},
+        "tool_response (64KB file)": {
+            "type": "tool_response",
+            "status": "success",
+            "result": {"status": "success", "result": "lorem ipsum dolor sit amet é " * 2200}
+        },
+        "tool_response (directory listing)": {
+            "type": "tool_response",
+            "status": "success",
+            "result": {"status": "success", "result": listing}
+        },
+        "response_delta": {"type": "response_delta", "content": "Hello", "request_id": "req-42"},
+        "call_tool (inbound)": {
+            "type": "call_tool",
+            "server": "filesystem",
+            "tool": "read_file",
+            "arguments": {"path": "/tmp/notes.txt"},
+            "request_id": "req-43"
+        }
+    }
+
+def load_codec(backend: str):
+    """app.codec reloaded with JSON_CODEC=backend, None if that backend is not installed"""
+    os.environ["JSON_CODEC"] = backend
+    logging.disable(logging.WARNING)  # Silence the fallback warning of missing backends
+    try:
+        codec = importlib.reload(app.codec)
+    finally:
+        logging.disable(logging.NOTSET)
+    return codec if codec.BACKEND == backend else None
+
+def bench(func, iterations: int) -> float:
+    """Microseconds per call"""
+    return timeit.timeit(func, number=iterations) / iterations * 1e6
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    frames = make_frames()
+    print(f"{'frame':36} {'codec':8} {'frame_text us':>14} {'loads us':>10} {'bytes':>8}")
+    for backend in BACKENDS:
+        codec = load_codec(backend)
+        if codec is None:
+            print(f"{backend} is not installed, skipped")
+            continue
+        for frame_name, frame in frames.items():
+            text = codec.frame_text(frame)
+            encode_time = bench(lambda: codec.frame_text(frame), iterations)
+            decode_time = bench(lambda: codec.loads(text), iterations)
+            print(f"{frame_name:36} {backend:8} {encode_time:14.1f} {decode_time:10.1f} "
+                  f"{len(text.encode('utf-8')):8}")
+
+        # The tools frame as the catalog sends it: encoded once, then reused per client
+        tools = frames["tools"]["tools"]
+        encoded = codec.EncodedFrame.wrap("tools", "tools", codec.dumps(tools))
+        reuse_time = bench(lambda: codec.frame_text(encoded), iterations)
+        print(f"{'tools (pre-encoded EncodedFrame)':36} {backend:8} {reuse_time:14.1f} {'':>10} {len(encoded.data):8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# tests/test_websocket.py is a script run by run_tests.sh against a live
+# server, and app/old holds superseded versions of the app
+collect_ignore = ["tests/test_websocket.py", "app/old"]
@@ -13,6 +13,6 @@ setup(
         "pydantic>=2.8.0",
         "jsonschema>=4.21.1",
         "sse-starlette>=2.0.0",
-        "mcp>=1.0.0"
+        "mcp>=1.6.0"
     ],
 )
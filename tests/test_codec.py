@@ -0,0 +1,18 @@
+import json
+from app import codec
+
+def test_dumps_and_loads_round_trip():
+    frame = {"type": "tools", "tools": [{"name": "read_file", "description": "é"}], "n": 1}
+    assert codec.loads(codec.dumps(frame)) == frame
+    assert json.loads(codec.dumps_text(frame)) == frame
+
+def test_encoded_frame_wraps_encoded_value():
+    frame = codec.EncodedFrame.wrap("tools", "tools", codec.dumps([{"name": "read_file"}]))
+    assert frame.type == "tools"
+    assert json.loads(frame.data) == {"type": "tools", "tools": [{"name": "read_file"}]}
+
+def test_frame_text_decodes_encoded_frames_once():
+    frame = codec.EncodedFrame.wrap("tools", "tools", codec.dumps([]))
+    text = codec.frame_text(frame)
+    assert json.loads(text) == {"type": "tools", "tools": []}
+    assert codec.frame_text(frame) is text
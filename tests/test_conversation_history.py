@@ -0,0 +1,61 @@
+from app.conversation_history import ConversationHistory, estimate_tokens
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+def turn(history: ConversationHistory, question: str, answer: str):
+    history.append({"role": "user", "content": question})
+    history.append({"role": "assistant", "content": answer})
+
+def test_oldest_turns_are_dropped_whole():
+    history = ConversationHistory(max_tokens=100)
+    for i in range(10):
+        turn(history, f"question {i} " + "x" * 80, f"answer {i} " + "y" * 80)
+
+    assert history.total_tokens <= 100
+    roles = [message["role"] for message in history]
+    # Each retained turn still starts with its user message
+    assert roles[0] == "user"
+    assert roles == ["user", "assistant"] * (len(roles) // 2)
+    assert list(history)[-1]["content"].startswith("answer 9")
+
+def test_build_keeps_current_turn_and_prepends_system_prompt():
+    history = ConversationHistory(max_tokens=45)
+    turn(history, "old " + "x" * 100, "reply")
+    history.append({"role": "user", "content": "new question"})
+    assert len(history) == 3  # Fits the budget alone, but not with the system prompt
+
+    messages = history.build(SYSTEM_PROMPT)
+    assert messages[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert messages[-1]["content"] == "new question"
+    assert all(not message["content"].startswith("old") for message in messages)
+
+def test_oversized_tool_result_of_current_turn_is_truncated():
+    history = ConversationHistory(max_tokens=200)
+    history.append({"role": "user", "content": "read the file"})
+    history.append({"role": "assistant", "content": None, "tool_calls": []})
+    history.append({"role": "tool", "tool_call_id": "1", "content": "z" * 4000})
+
+    messages = history.build(SYSTEM_PROMPT)
+    tool_message = messages[-1]
+    assert "[truncated" in tool_message["content"]
+    assert sum(estimate_tokens(message) for message in messages) <= 200 + 10
+    # The stored history is left untouched
+    assert len(list(history)[-1]["content"]) == 4000
+
+def test_summary_of_dropped_turns():
+    history = ConversationHistory(max_tokens=80, summarize=True, summary_max_tokens=40)
+    for i in range(5):
+        turn(history, f"question {i} " + "x" * 60, f"answer {i}")
+
+    assert history.summary.startswith("Summary of the earlier conversation:")
+    messages = history.build(SYSTEM_PROMPT)
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"] == history.summary
+
+def test_clear():
+    history = ConversationHistory()
+    turn(history, "hello", "hi")
+    history.clear()
+    assert len(history) == 0
+    assert history.total_tokens == 0
+    assert history.build(SYSTEM_PROMPT) == [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -0,0 +1,56 @@
+from app.execution_history import ExecutionHistory
+
+def test_ring_buffer_evicts_oldest_entries():
+    history = ExecutionHistory(capacity=3)
+    for i in range(5):
+        history.record(f"use-{i}", "read_file", {"path": str(i)})
+
+    assert len(history) == 3
+    assert [entry['toolUseId'] for entry in history.query()] == ["use-2", "use-3", "use-4"]
+    assert history.get("use-0") is None
+    assert history.get("use-4")['input'] == {"path": "4"}
+
+def test_byte_budget_evicts_and_truncates_inputs():
+    history = ExecutionHistory(capacity=10, max_bytes=40)
+    history.record("a", "write_file", {"content": "x" * 20})
+    history.record("b", "write_file", {"content": "y" * 20})
+    assert len(history) == 1
+    assert history.size_bytes <= 40
+
+    entry = history.record("c", "write_file", {"content": "z" * 100})
+    assert entry['input']['_truncated'] is True
+
+def test_query_filters_by_tool_and_limit():
+    history = ExecutionHistory(capacity=10)
+    for i in range(6):
+        history.record(str(i), "read_file" if i % 2 else "list_directory", {})
+
+    assert [entry['toolUseId'] for entry in history.query(tool_name="read_file")] == ["1", "3", "5"]
+    assert [entry['toolUseId'] for entry in history.query(limit=2)] == ["4", "5"]
+    assert history.query(tool_name="unknown") == []
+
+def test_query_time_window():
+    history = ExecutionHistory(capacity=10)
+    for i in range(3):
+        entry = history.record(str(i), "read_file", {})
+        entry['timestamp'] = 100.0 + i
+
+    assert [entry['toolUseId'] for entry in history.query(since=101)] == ["1", "2"]
+    assert [entry['toolUseId'] for entry in history.query(until=101)] == ["0", "1"]
+
+def test_complete_records_status_and_latency():
+    history = ExecutionHistory()
+    entry = history.record("a", "read_file", {})
+    assert entry['status'] == 'pending'
+    history.complete(entry, 'success')
+    assert history.get("a")['status'] == 'success'
+    assert history.get("a")['latency_ms'] >= 0
+
+def test_clear_keeps_recording():
+    history = ExecutionHistory(capacity=2)
+    history.record("a", "read_file", {})
+    history.clear()
+    assert len(history) == 0
+    assert history.get("a") is None
+    history.record("b", "read_file", {})
+    assert [entry['toolUseId'] for entry in history.query()] == ["b"]
@@ -0,0 +1,90 @@
+import asyncio
+from app.mcp_pool import MCPClientPool
+
+class FakeClient:
+    """Stand-in for MCPClient, calls block until release is set"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.session = None
+        self.max_in_flight = 1
+        self.in_flight = 0
+        self.queued = 0
+        self.closed = False
+        self.release = asyncio.Event()
+
+    async def connect(self):
+        if self.fail:
+            raise RuntimeError("spawn failed")
+        self.session = object()
+
+    async def close(self):
+        self.closed = True
+        self.session = None
+
+    async def get_available_tools(self):
+        return []
+
+    async def call_tool(self, tool_name, arguments):
+        self.in_flight += 1
+        try:
+            await self.release.wait()
+            return {"status": "success"}
+        finally:
+            self.in_flight -= 1
+
+def test_connect_starts_initial_replicas():
+    async def run():
+        pool = MCPClientPool("fs", FakeClient, min_replicas=1, max_replicas=3, initial_replicas=2)
+        await pool.connect()
+        assert len(pool.replicas) == 2
+        await pool.close()
+        assert pool.replicas == []
+    asyncio.run(run())
+
+def test_connect_keeps_replicas_that_started():
+    async def run():
+        clients = iter([FakeClient(), FakeClient(fail=True)])
+        pool = MCPClientPool("fs", lambda: next(clients), min_replicas=2, max_replicas=2)
+        await pool.connect()
+        assert len(pool.replicas) == 1
+        await pool.close()
+    asyncio.run(run())
+
+def test_calls_go_to_least_loaded_replica_and_scale_up():
+    async def run():
+        created = []
+
+        def factory():
+            created.append(FakeClient())
+            return created[-1]
+
+        pool = MCPClientPool("fs", factory, min_replicas=1, max_replicas=2)
+        await pool.connect()
+        first = asyncio.create_task(pool.call_tool("read", {}))
+        await asyncio.sleep(0)
+        # The only replica is saturated, the next call triggers a new replica
+        second = asyncio.create_task(pool.call_tool("read", {}))
+        await asyncio.sleep(0.01)
+        assert len(pool.replicas) == 2
+        third = asyncio.create_task(pool.call_tool("read", {}))
+        await asyncio.sleep(0)
+        assert created[1].in_flight == 1
+
+        for client in created:
+            client.release.set()
+        await asyncio.gather(first, second, third)
+        await pool.close()
+    asyncio.run(run())
+
+def test_idle_replicas_above_min_are_reaped():
+    async def run():
+        pool = MCPClientPool("fs", FakeClient, min_replicas=1, max_replicas=2,
+                             initial_replicas=2, idle_timeout=0)
+        await pool.connect()
+        replicas = list(pool.replicas)
+        await asyncio.sleep(1.1)  # The reaper checks at most once per second
+        assert len(pool.replicas) == 1
+        assert [replica.closed for replica in replicas].count(True) == 1
+        await pool.close()
+    asyncio.run(run())
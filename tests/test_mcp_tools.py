@@ -0,0 +1,51 @@
+import asyncio
+from app.mcp_tools import MCPToolManager
+
+def catalog_tool(server_name: str, name: str):
+    return {"serverName": server_name, "name": name, "description": "", "input_schema": {}}
+
+def test_routes_bare_and_qualified_names():
+    manager = MCPToolManager()
+    manager.update_tools([catalog_tool("fs", "read_file"), catalog_tool("git", "log")])
+
+    assert manager.resolve("read_file")['server'] == "fs"
+    assert manager.resolve("git.log") == {'server': "git", 'tool': "log", 'input_schema': {}}
+    assert manager.resolve("missing") is None
+    assert manager.get_lookup_stats()['misses'] == 1
+
+def test_duplicate_names_get_unique_function_names():
+    manager = MCPToolManager()
+    manager.update_tools([
+        catalog_tool("git", "read_file"),
+        catalog_tool("fs", "read_file"),
+        catalog_tool("fs", "list_directory"),
+    ])
+
+    assert manager.duplicate_names == {"read_file": ["fs", "git"]}
+    assert manager.function_name("fs", "read_file") == "fs__read_file"
+    assert manager.function_name("git", "read_file") == "git__read_file"
+    assert manager.function_name("fs", "list_directory") == "list_directory"
+    assert manager.resolve("git__read_file")['server'] == "git"
+    # The bare name keeps routing to the first server alphabetically
+    assert manager.resolve("read_file")['server'] == "fs"
+
+def test_illegal_function_names_are_sanitized():
+    manager = MCPToolManager()
+    manager.update_tools([catalog_tool("web", "fetch.url"), catalog_tool("web", "fetch_url")])
+
+    name = manager.function_name("web", "fetch.url")
+    assert name not in ("fetch.url", "fetch_url")
+    assert manager.resolve(name)['tool'] == "fetch.url"
+    assert manager.function_name("web", "fetch_url") == "fetch_url"
+
+def test_execute_tool_uses_connection_pool():
+    class Pool:
+        async def call_tool(self, server_name, tool_name, arguments, tool_use_id=None):
+            return (server_name, tool_name, arguments, tool_use_id)
+
+    manager = MCPToolManager(Pool())
+    manager.update_tools([catalog_tool("fs", "read_file"), catalog_tool("git", "read_file")])
+    result = asyncio.run(manager.execute_tool(
+        {"toolUseId": "call-1", "name": "git__read_file", "input": {"path": "a"}}
+    ))
+    assert result == ("git", "read_file", {"path": "a"}, "call-1")
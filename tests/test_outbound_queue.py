@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from app.outbound_queue import OutboundQueue, DROP_OLDEST, COALESCE, DISCONNECT
+
+class Socket:
+    """Records sent frames and how the socket was closed"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def send(self, data):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed_with = 1008
+
+    async def abort(self):
+        self.closed_with = 1011
+
+def make_queue(socket: Socket, policy: str, max_size: int = 2) -> OutboundQueue:
+    return OutboundQueue("client", socket.send, socket.close, max_size=max_size,
+                         overflow_policy=policy, abort=socket.abort)
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        OutboundQueue("client", Socket().send, Socket().close, overflow_policy="block")
+
+def test_writer_sends_in_order():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, DROP_OLDEST, max_size=10)
+        queue.start()
+        for i in range(3):
+            queue.put({"type": "response", "n": i})
+        await asyncio.sleep(0.01)
+        assert [frame["n"] for frame in socket.sent] == [0, 1, 2]
+        assert queue.stats['sent'] == 3
+        await queue.close()
+    asyncio.run(run())
+
+def test_drop_oldest_spares_replies():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, DROP_OLDEST)
+        queue.put({"type": "response", "n": 0}, reply=True)
+        queue.put({"type": "tools", "n": 1})
+        assert queue.put({"type": "response", "n": 2}, reply=True)
+
+        queue.start()
+        await asyncio.sleep(0.01)
+        assert [frame["n"] for frame in socket.sent] == [0, 2]
+        assert queue.stats['dropped'] == 1
+        await queue.close()
+    asyncio.run(run())
+
+def test_coalesce_replaces_superseded_pushes():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, COALESCE)
+        queue.put({"type": "tools", "n": 0})
+        queue.put({"type": "tools", "n": 1}, reply=True)  # Answers a connect, kept
+        queue.put({"type": "tools", "n": 2})
+
+        queue.start()
+        await asyncio.sleep(0.01)
+        assert [frame["n"] for frame in socket.sent] == [1, 2]
+        assert queue.stats['coalesced'] == 1
+        await queue.close()
+    asyncio.run(run())
+
+def test_full_of_replies_disconnects():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, DROP_OLDEST)
+        queue.put({"type": "response"}, reply=True)
+        queue.put({"type": "response", "request_id": "r1"})
+        assert not queue.put({"type": "response"}, reply=True)
+        await asyncio.sleep(0)
+        assert queue.closed
+        assert socket.closed_with == 1008
+        assert not queue.put({"type": "response"})
+    asyncio.run(run())
+
+def test_push_is_dropped_when_full_of_replies():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, COALESCE)
+        queue.put({"type": "response"}, reply=True)
+        queue.put({"type": "response"}, reply=True)
+        assert not queue.put({"type": "tools"})
+        assert not queue.closed
+        assert len(queue) == 2
+        assert queue.stats['dropped'] == 1
+        await queue.close()
+    asyncio.run(run())
+
+def test_disconnect_policy():
+    async def run():
+        socket = Socket()
+        queue = make_queue(socket, DISCONNECT, max_size=1)
+        queue.put({"type": "tools"})
+        assert not queue.put({"type": "tools"})
+        await asyncio.sleep(0)
+        assert socket.closed_with == 1008
+    asyncio.run(run())
+
+def test_failed_send_aborts_the_socket():
+    async def run():
+        socket = Socket(fail=True)
+        queue = make_queue(socket, DROP_OLDEST)
+        queue.start()
+        queue.put({"type": "response"}, reply=True)
+        await asyncio.sleep(0.01)
+        assert queue.closed
+        assert socket.closed_with == 1011
+        await queue.close()
+    asyncio.run(run())
+
+def test_encoding_errors_reach_the_sender():
+    def encode(frame):
+        raise TypeError("not serializable")
+
+    async def run():
+        queue = OutboundQueue("client", Socket().send, Socket().close, encode=encode)
+        with pytest.raises(TypeError):
+            queue.put({"type": "response"})
+        assert len(queue) == 0
+    asyncio.run(run())
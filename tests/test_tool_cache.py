@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from app.tool_cache import SingleFlight, ToolResultCache, call_key
+
+def test_call_key_canonicalizes_arguments():
+    assert call_key("fs", "read", {"b": 1, "a": 2}) == call_key("fs", "read", {"a": 2, "b": 1})
+    assert call_key("fs", "read", None) == call_key("fs", "read", {})
+
+def test_single_flight_shares_concurrent_calls():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return {"status": "success"}
+
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+
+        assert len(calls) == 1
+        assert results[0] is results[1]
+        assert flight.stats == {'calls': 1, 'shared': 1}
+        assert len(flight) == 0
+
+        # Once finished, the next call goes upstream again
+        await flight.do("key", fetch)
+        assert len(calls) == 2
+    asyncio.run(run())
+
+def test_single_flight_cancelled_caller_does_not_cancel_others():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    asyncio.run(run())
+
+def test_single_flight_shares_errors():
+    async def run():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0)
+            raise RuntimeError("server down")
+
+        results = await asyncio.gather(
+            flight.do("key", fetch), flight.do("key", fetch), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(flight) == 0
+    asyncio.run(run())
+
+def test_cache_hit_and_expiry():
+    cache = ToolResultCache()
+    key = call_key("fs", "read", {"path": "a"})
+    cache.put(key, {"status": "success"}, ttl=60)
+    assert cache.get(key) == {"status": "success"}
+
+    cache.put(key, {"status": "success"}, ttl=0)
+    assert cache.get(key) is None
+    assert len(cache) == 0
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+def test_cache_evicts_least_recently_used():
+    cache = ToolResultCache(max_entries=2)
+    keys = [call_key("fs", "read", {"path": str(i)}) for i in range(3)]
+    cache.put(keys[0], 0, ttl=60)
+    cache.put(keys[1], 1, ttl=60)
+    cache.get(keys[0])
+    cache.put(keys[2], 2, ttl=60)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0
+    assert cache.stats['evictions'] == 1
+
+def test_cache_byte_budget():
+    cache = ToolResultCache(max_bytes=50)
+    cache.put(call_key("fs", "read", {"path": "big"}), "x" * 100, ttl=60)
+    assert len(cache) == 0
+    cache.put(call_key("fs", "read", {"path": "a"}), "x" * 30, ttl=60)
+    cache.put(call_key("fs", "read", {"path": "b"}), "y" * 30, ttl=60)
+    assert cache.size_bytes <= 50
+    assert len(cache) == 1
+
+def test_invalidate_server_drops_its_entries_only():
+    cache = ToolResultCache()
+    fs_key = call_key("fs", "read", {})
+    git_key = call_key("git", "log", {})
+    cache.put(fs_key, 1, ttl=60)
+    cache.put(git_key, 2, ttl=60)
+
+    assert cache.invalidate_server("fs") == 1
+    assert cache.get(fs_key) is None
+    assert cache.get(git_key) == 2
+    assert cache.size_bytes == len(b"2")
+
+def test_read_started_before_a_write_is_not_cached():
+    cache = ToolResultCache()
+    key = call_key("fs", "read", {})
+    generation = cache.generation("fs")
+    cache.invalidate_server("fs")  # A write completes while the read is in flight
+    cache.put(key, "stale", ttl=60, generation=generation)
+    assert cache.get(key) is None
+
+    cache.put(key, "fresh", ttl=60, generation=cache.generation("fs"))
+    assert cache.get(key) == "fresh"
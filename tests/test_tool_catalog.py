@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+from app.tool_catalog import ToolCatalog
+
+def mcp_tool(name: str, annotations=None):
+    """Stand-in for mcp.types.Tool"""
+    return SimpleNamespace(
+        name=name,
+        description=f"{name} description",
+        inputSchema={"type": "object"},
+        annotations=annotations
+    )
+
+def test_read_only_hint_as_dict_or_model():
+    catalog = ToolCatalog()
+    catalog.set_server_tools("fs", [
+        mcp_tool("read_file", {"readOnlyHint": True}),  # Older mcp versions keep it as a dict
+        mcp_tool("list_directory", SimpleNamespace(readOnlyHint=True)),
+        mcp_tool("write_file", {"readOnlyHint": False}),
+        mcp_tool("move_file"),
+    ])
+
+    assert catalog.is_read_only("fs", "read_file")
+    assert catalog.is_read_only("fs", "list_directory")
+    assert not catalog.is_read_only("fs", "write_file")
+    assert not catalog.is_read_only("fs", "move_file")
+    assert not catalog.is_read_only("git", "read_file")
+
+def test_version_bumps_only_on_change():
+    catalog = ToolCatalog()
+    assert catalog.set_server_tools("fs", [mcp_tool("read_file")])
+    assert catalog.version == 1
+    assert not catalog.set_server_tools("fs", [mcp_tool("read_file")])
+    assert catalog.version == 1
+
+    assert catalog.remove_server("fs")
+    assert not catalog.has_server("fs")
+    assert catalog.version == 2
+    assert not catalog.remove_server("fs")
+
+def test_snapshot_encoding_and_etag():
+    catalog = ToolCatalog()
+    catalog.set_server_tools("fs", [mcp_tool("read_file")])
+    catalog.set_server_tools("git", [mcp_tool("log")])
+
+    tools = catalog.get_tools()
+    assert [tool["serverName"] for tool in tools] == ["fs", "git"]
+    assert json.loads(catalog.encoded()) == tools
+    assert catalog.get_tools("git") == [tools[1]]
+
+    frame = catalog.tools_frame()
+    assert catalog.tools_frame() is frame
+    assert json.loads(frame.data) == {"type": "tools", "tools": tools}
+
+    etag = catalog.etag
+    assert catalog.matches_etag(etag)
+    assert catalog.matches_etag(f'W/{etag}, "other"')
+    assert not catalog.matches_etag('"other"')
+    assert not catalog.matches_etag(None)
+
+    catalog.set_server_tools("git", [])
+    assert catalog.etag != etag
+    assert catalog.tools_frame() is not frame
@@ -0,0 +1,70 @@
+from app.tool_index import ToolIndex, tokenize
+
+FILESYSTEM_TOOLS = [
+    ("read_file", "Read the complete contents of a file"),
+    ("read_multiple_files", "Read the contents of multiple files at once"),
+    ("write_file", "Create a new file or overwrite an existing file with new content"),
+    ("edit_file", "Make line-based edits to a text file"),
+    ("create_directory", "Create a new directory or ensure a directory exists"),
+    ("list_directory", "Get a detailed listing of all files and directories in a path"),
+    ("directory_tree", "Get a recursive tree view of files and directories"),
+    ("move_file", "Move or rename files and directories"),
+    ("search_files", "Recursively search for files and directories matching a pattern"),
+    ("get_file_info", "Retrieve detailed metadata about a file or directory"),
+    ("list_allowed_directories", "Returns the list of directories this server is allowed to access"),
+]
+
+def definitions():
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": {"type": "object", "properties": {"path": {"type": "string"}}}
+            }
+        }
+        for name, description in FILESYSTEM_TOOLS
+    ]
+
+def names(tools):
+    return [tool["function"]["name"] for tool in tools]
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("readFile and list_directory") == ["read", "file", "and", "list", "directory"]
+
+def test_select_ranks_relevant_tools_first():
+    index = ToolIndex(definitions())
+    scores = index.scores("rename this file")
+    best = max(range(len(scores)), key=scores.__getitem__)
+    assert names(index.tools)[best] == "move_file"
+
+def test_select_fills_up_to_k():
+    index = ToolIndex(definitions())
+    selected = index.select("move it", 4)
+    assert len(selected) == 4
+    assert "move_file" in names(selected)
+    # Selected tools keep the catalog order
+    assert names(selected) == [name for name in names(index.tools) if name in names(selected)]
+
+def test_small_catalogs_are_sent_whole():
+    index = ToolIndex(definitions())
+    assert index.select("create a folder", 4, min_tools=32) is index.tools
+    assert index.select("create a folder", 0) is index.tools
+    assert index.select("create a folder", 20) is index.tools
+
+def test_no_match_sends_every_tool():
+    index = ToolIndex(definitions())
+    assert index.select("hello there", 4) is index.tools
+
+def test_always_include_and_counters():
+    index = ToolIndex(definitions())
+    selected = index.select("move it", 2, always_include=["list_allowed_directories"])
+    assert "list_allowed_directories" in names(selected)
+    assert len(selected) == 3
+
+    stats = index.stats()
+    assert stats['queries'] == 1
+    assert stats['tools_sent'] == 3
+    assert stats['tools_skipped'] == len(FILESYSTEM_TOOLS) - 3
+    assert stats['tokens_saved'] > 0
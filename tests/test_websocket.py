@@ -5,6 +5,11 @@ import logging
 import traceback
 from typing import Dict, Any
 
+try:
+    import msgpack
+except ImportError:  # The msgpack subprotocol test is skipped without it
+    msgpack = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -70,6 +75,11 @@ class WebSocketTestClient:
             response = await self.receive_json()
             assert response["type"] == "connection_established"
             assert response["status"] == "connected"
+
+            # The server then pushes the tool catalog
+            response = await self.receive_json()
+            assert response["type"] == "tools"
+            assert "tools" in response
             logger.info("✅ Connection test passed")
         except Exception as e:
             logger.error(f"Connection test failed: {str(e)}")
@@ -84,8 +94,13 @@ class WebSocketTestClient:
                 "server": server_name
             })
             response = await self.receive_json()
-            assert response["type"] == "connect_response"
-            assert response["status"] == "success"
+            assert response["type"] == "connection_established"
+            assert response["server"] == server_name
+
+            # Followed by the updated tool catalog
+            response = await self.receive_json()
+            assert response["type"] == "tools"
+            assert any(tool["serverName"] == server_name for tool in response["tools"])
             logger.info(f"✅ Server connection test passed for {server_name}")
         except Exception as e:
             logger.error(f"Server connection test failed for {server_name}: {str(e)}")
@@ -140,19 +155,66 @@ class WebSocketTestClient:
             logger.error(f"Tool call test failed for {tool_name}: {str(e)}")
             raise
 
+    async def test_request_id_pipelining(self, server_name: str):
+        """Test that concurrent requests get replies echoing their request_id"""
+        try:
+            logger.info("Testing request_id pipelining...")
+            request_ids = ["req-1", "req-2"]
+            for request_id in request_ids:
+                await self.send_json({
+                    "type": "connect",
+                    "server": server_name,
+                    "request_id": request_id
+                })
+
+            # Each connect answers with connection_established and tools
+            seen = {}
+            for _ in range(2 * len(request_ids)):
+                response = await self.receive_json()
+                assert response.get("request_id") in request_ids, "Reply must echo a request_id"
+                seen.setdefault(response["request_id"], []).append(response["type"])
+
+            for request_id in request_ids:
+                assert sorted(seen[request_id]) == ["connection_established", "tools"]
+            logger.info("✅ Request id pipelining test passed")
+        except Exception as e:
+            logger.error(f"Request id pipelining test failed: {str(e)}")
+            raise
+
+    async def test_msgpack_subprotocol(self):
+        """Test that a client negotiating msgpack gets binary frames with the same schema"""
+        if msgpack is None:
+            logger.info("msgpack is not installed, skipping the msgpack subprotocol test")
+            return
+        try:
+            logger.info("Testing msgpack subprotocol...")
+            async with websockets.connect(self.uri + "-msgpack", subprotocols=["msgpack"]) as websocket:
+                assert websocket.subprotocol == "msgpack", "Server must accept the msgpack subprotocol"
+
+                frame = await asyncio.wait_for(websocket.recv(), timeout=30)
+                assert isinstance(frame, bytes), "Frames must be binary"
+                response = msgpack.unpackb(frame, raw=False)
+                assert response["type"] == "connection_established"
+
+                frame = await asyncio.wait_for(websocket.recv(), timeout=30)
+                assert msgpack.unpackb(frame, raw=False)["type"] == "tools"
+
+                await websocket.send(msgpack.packb({"type": "get_tools", "request_id": "req-mp"}))
+                response = msgpack.unpackb(await asyncio.wait_for(websocket.recv(), timeout=30), raw=False)
+                assert response["type"] == "tools_response"
+                assert response["request_id"] == "req-mp"
+            logger.info("✅ Msgpack subprotocol test passed")
+        except Exception as e:
+            logger.error(f"Msgpack subprotocol test failed: {str(e)}")
+            raise
+
     async def test_reconnection(self):
         """Test reconnection functionality"""
         try:
             logger.info("Testing reconnection...")
             
             # First connect to the filesystem server
-            await self.send_json({
-                "type": "connect",
-                "server": "filesystem"
-            })
-            response = await self.receive_json()
-            assert response["type"] == "connect_response"
-            assert response["status"] == "success"
+            await self.test_connect_to_server("filesystem")
             logger.info("✅ Initial server connection successful")
 
             # Close the websocket to simulate a disconnection
@@ -166,18 +228,15 @@ class WebSocketTestClient:
             self.websocket = await websockets.connect(self.uri)
             logger.info("Reconnected to WebSocket")
 
-            # Should receive connection established message
+            # Should receive connection established message and the tool catalog,
+            # which still lists the filesystem server's tools
             response = await self.receive_json()
             assert response["type"] == "connection_established"
             assert response["status"] == "connected"
-            logger.info("✅ Reconnection handshake successful")
-
-            # Should receive reconnection status with reconnected servers
             response = await self.receive_json()
-            assert response["type"] == "reconnection_status"
-            assert "reconnected_servers" in response
-            assert "filesystem" in response["reconnected_servers"]
-            logger.info("✅ Server connections restored")
+            assert response["type"] == "tools"
+            assert any(tool["serverName"] == "filesystem" for tool in response["tools"])
+            logger.info("✅ Reconnection handshake successful")
 
             # Verify we can still use tools
             await self.test_get_tools("filesystem")
@@ -205,16 +264,22 @@ async def run_tests():
             tools = await client.test_get_tools("filesystem")
             
             # Test 4: Call a tool
-            if tools:
-                # Utiliser le premier outil disponible pour le test
-                tool = tools[0]
+            # Utiliser un outil sans argument obligatoire, les arguments sont validés
+            tool = next((tool for tool in tools if not (tool["input_schema"] or {}).get("required")), None)
+            if tool:
                 await client.test_call_tool(
                     server_name="filesystem",
                     tool_name=tool["name"],
                     arguments={}  # Utiliser un argument vide pour le test
                 )
             
-            # Test 5: Test reconnection
+            # Test 5: Pipelined requests
+            await client.test_request_id_pipelining("filesystem")
+
+            # Test 6: Binary msgpack frames
+            await client.test_msgpack_subprotocol()
+
+            # Test 7: Test reconnection
             await client.test_reconnection()
             
             logger.info("✅ All tests passed successfully!")
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import threading
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mcp")
+pytest.importorskip("openai")
+pytest.importorskip("jsonschema")
+
+from types import SimpleNamespace
+from starlette.testclient import TestClient
+
+# app/main.py is run as a script and imports its sibling modules directly
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app import main
+
+def test_endpoint_exits_when_the_outbox_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(main.manager, "queue_size", 1)
+    monkeypatch.setattr(main.manager, "overflow_policy", "disconnect")
+    closes = []
+
+    def session():
+        client = TestClient(main.app)
+        with client.websocket_connect("/ws/overflow") as websocket:
+            websocket.send_json({"type": "get_tools"})
+            for _ in range(10):
+                message = websocket.receive()
+                if message["type"] == "websocket.close":
+                    closes.append(message["code"])
+                    break
+
+    # Leaving the connection waits for the endpoint, which used to spin forever
+    thread = threading.Thread(target=session, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "websocket_endpoint kept running after the socket was closed"
+
+    assert closes == [1008]
+    assert "overflow" not in main.manager.outboxes
+    assert not main.manager._sockets
+
+def test_refresh_notifies_only_when_the_catalog_changes():
+    class Pool:
+        session = object()
+        tools = [SimpleNamespace(name="read_file", description="", inputSchema={"type": "object"})]
+
+        async def get_available_tools(self):
+            return self.tools
+
+    mcp_manager = main.MCPManager()
+    mcp_manager.mcp_clients["fs"] = pool = Pool()
+    changes = []
+    mcp_manager.on_catalog_changed = lambda: changes.append(mcp_manager.tool_catalog.version)
+
+    asyncio.run(mcp_manager.refresh_tools("fs"))
+    asyncio.run(mcp_manager.refresh_tools("fs"))
+    pool.tools = []
+    asyncio.run(mcp_manager.refresh_tools("fs"))
+    assert changes == [1, 2]